@@ -1,20 +1,1013 @@
 
-import tkinter as tk  # Import the tkinter module for GUI
-from tkinter import ttk  # Import themed tkinter widgets
-from tkinter import messagebox  # Import messagebox for displaying messages
 import datetime  # Import datetime module for date and time operations
+import calendar  # Import calendar for the length of months in date prefixes
 import json  # Import json module for JSON handling
+import functools  # Import functools for caching date conversions
+import bisect  # Import bisect for the sorted secondary indexes
+import os  # Import os for atomic file replacement and fsync
+import threading  # Import threading for background journal compaction
+import time  # Import time for batching journal fsyncs
+import csv  # Import csv for parsing bulk transaction files
+import re  # Import re for skipping whitespace in the streaming JSON reader
+import mmap  # Import mmap for zero-copy reads of binary snapshots
+import struct  # Import struct for the binary snapshot header
+import sys  # Import sys for the byte order and command line arguments
+import queue  # Import queue for handing background results back to the GUI
+import itertools  # Import itertools for reading bulk files in batches
+import glob  # Import glob for importing several bulk files at once
+import collections  # Import collections for the search result cache
+import contextlib  # Import contextlib for optionally compressed exports
+import gzip  # Import gzip for compressing exports on the fly
+import io  # Import io for formatting export batches in memory
+import argparse  # Import argparse for the batch command line
+try:
+    import fcntl  # Import fcntl for locking the ledger against other processes on POSIX
+except ImportError:
+    fcntl = None
+    import msvcrt  # Import msvcrt for locking the ledger against other processes on Windows
+from array import array  # Import array for compact typed columns
+
+TRANSACTION_TYPES = ("income", "expense")  # Transaction types, their position is the code stored per row
+
+
+# Function that converts a YYYY-MM-DD date into a day ordinal
+@functools.lru_cache(maxsize=65536)
+def date_to_ordinal(date):
+    if len(date) == 10 and date[4] == date[7] == "-":
+        return datetime.date.fromisoformat(date).toordinal()
+    return datetime.datetime.strptime(date, '%Y-%m-%d').toordinal()  # Also accepts 2024-5-1, like the prompts
+
+
+# Function that converts a day ordinal back into a YYYY-MM-DD date
+@functools.lru_cache(maxsize=65536)
+def ordinal_to_date(ordinal):
+    return datetime.date.fromordinal(ordinal).isoformat()
+
+
+# Class that keeps (key, slot) pairs sorted by key in two parallel arrays
+class SortedIndex:
+    def __init__(self, typecode, column, slots):
+        ordered = sorted(slots, key=column.__getitem__)
+        self.keys = array(typecode, [column[slot] for slot in ordered])
+        self.slots = array("q", ordered)
+
+    def insert(self, key, slot):
+        position = bisect.bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.slots.insert(position, slot)
+
+    def remove(self, key, slot):
+        start = bisect.bisect_left(self.keys, key)
+        position = self.slots.index(slot, start, bisect.bisect_right(self.keys, key, start))
+        del self.keys[position]
+        del self.slots[position]
+
+    # Function that returns the positions of the keys between low and high, searching only positions start to end
+    def span(self, low, high, start=0, end=None):
+        end = len(self.keys) if end is None else end
+        start = bisect.bisect_left(self.keys, low, start, end)
+        return start, bisect.bisect_right(self.keys, high, start, end)
+
+    # Function that returns the slots whose key is between low and high, both included
+    def between(self, low, high):
+        start, end = self.span(low, high)
+        return self.slots[start:end]
+
+
+# Class that maintains the secondary indexes used for searching a TransactionStore
+class TransactionIndexes:
+    def __init__(self, store):
+        self.store = store
+        slots = store.slots()
+        self.amount_index = SortedIndex("d", store.amounts, slots)
+        self.date_index = SortedIndex("i", store.dates, slots)
+        self.slots_by_type = [self.matching_type(type_code) for type_code in range(len(TRANSACTION_TYPES))]
+        self.folded_categories = {}  # Case-folded name -> category ids
+        self.sorted_folded = []  # Case-folded names in order, for prefix matching
+        self.indexed_categories = 0
+        self.register_categories()
+
+    def register_categories(self):
+        for category_id in range(self.indexed_categories, len(self.store.category_names)):
+            folded = self.store.category_names[category_id].casefold()
+            if folded not in self.folded_categories:
+                self.folded_categories[folded] = []
+                bisect.insort(self.sorted_folded, folded)
+            self.folded_categories[folded].append(category_id)
+        self.indexed_categories = len(self.store.category_names)
+
+    def add(self, slot):
+        store = self.store
+        self.amount_index.insert(store.amounts[slot], slot)
+        self.date_index.insert(store.dates[slot], slot)
+        bisect.insort(self.slots_by_type[store.types[slot]], slot)
+        if store.category_ids[slot] >= self.indexed_categories:
+            self.register_categories()
+
+    def remove(self, slot):
+        store = self.store
+        self.amount_index.remove(store.amounts[slot], slot)
+        self.date_index.remove(store.dates[slot], slot)
+        type_slots = self.slots_by_type[store.types[slot]]
+        del type_slots[bisect.bisect_left(type_slots, slot)]
+
+    # Function that leaves out deleted slots, which stay in the indexes until compact_slots renumbers the slots
+    def live(self, slots):
+        if not self.store.deleted:
+            return slots
+        return array("q", itertools.compress(slots, map(self.store.alive.__getitem__, slots)))
+
+    def amount_between(self, low, high):
+        return self.live(self.amount_index.between(float(low), float(high)))
+
+    def amount_equal(self, amount):
+        return self.amount_between(amount, amount)
+
+    def date_between(self, start_date, end_date):
+        return self.live(self.date_index.between(date_to_ordinal(start_date), date_to_ordinal(end_date)))
+
+    def date_equal(self, date):
+        return self.date_between(date, date)
+
+    def month(self, year, month):
+        first_day = datetime.date(year, month, 1)
+        next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+        return self.live(self.date_index.between(first_day.toordinal(), next_month.toordinal() - 1))
+
+    # Function that returns the live slots of a type in slot order, a byte mask is built from the type column
+    # without a Python loop
+    def matching_type(self, type_code):
+        matches = self.store.types.tobytes().translate(bytes(code == type_code for code in range(256)))
+        # Bytes have no bitwise and, so the two 0/1 masks are combined as big integers
+        live = (int.from_bytes(matches, "little") & int.from_bytes(self.store.alive, "little"))
+        return array("q", itertools.compress(range(len(matches)), live.to_bytes(len(matches), "little")))
+
+    def type_slots(self, transaction_type):
+        return self.live(self.slots_by_type[TRANSACTION_TYPES.index(transaction_type.lower())][:])
+
+    def category_ids(self, category):
+        return self.folded_categories.get(category.casefold(), [])
+
+    # Function that returns the category ids whose case-folded name starts with prefix
+    def category_ids_with_prefix(self, prefix):
+        prefix = prefix.casefold()
+        position = bisect.bisect_left(self.sorted_folded, prefix)
+        category_ids = []
+        while position < len(self.sorted_folded) and self.sorted_folded[position].startswith(prefix):
+            category_ids.extend(self.folded_categories[self.sorted_folded[position]])
+            position += 1
+        return category_ids
+
+    def category(self, category):
+        return [slot for category_id in self.category_ids(category)
+                for slot in self.store.live_category_slots(category_id)]
+
+    def category_prefix(self, prefix):
+        return [slot for category_id in self.category_ids_with_prefix(prefix)
+                for slot in self.store.live_category_slots(category_id)]
+
+
+# Class that keeps running income and expense totals overall, per category and per month
+class TransactionTotals:
+    def __init__(self, store):
+        self.store = store
+        self.totals = [0.0, 0.0]  # Indexed by type code
+        self.by_category = {}  # Category id -> [income, expense]
+        self.by_month = {}  # YYYY-MM -> [income, expense]
+        for slot in store.slots():
+            self.add(slot)
+
+    def add(self, slot, sign=1):
+        store = self.store
+        amount = store.amounts[slot] * sign
+        type_code = store.types[slot]
+        self.totals[type_code] += amount
+        category_totals = self.by_category.get(store.category_ids[slot])
+        if category_totals is None:
+            category_totals = self.by_category[store.category_ids[slot]] = [0.0, 0.0]
+        category_totals[type_code] += amount
+        month = ordinal_to_date(store.dates[slot])[:7]
+        month_totals = self.by_month.get(month)
+        if month_totals is None:
+            month_totals = self.by_month[month] = [0.0, 0.0]
+        month_totals[type_code] += amount
+
+    def remove(self, slot):
+        self.add(slot, -1)
+
+    # Function that returns (income, expense, net) rounded to cents from [income, expense]
+    @staticmethod
+    def summarize(totals):
+        income, expense = round(totals[0], 2), round(totals[1], 2)
+        return income, expense, round(income - expense, 2)
+
+    def summary(self):
+        return self.summarize(self.totals)
+
+    def category_summary(self, category):
+        category_id = self.store.category_lookup.get(category)
+        return self.summarize(self.by_category.get(category_id, (0.0, 0.0)))
+
+    def month_summary(self, month):
+        return self.summarize(self.by_month.get(month, (0.0, 0.0)))
+
+    # Function that totals every month from first_month to last_month, both YYYY-MM and included
+    def months_summary(self, first_month, last_month):
+        totals = [0.0, 0.0]
+        for month, month_totals in self.by_month.items():
+            if first_month <= month <= last_month:
+                totals[0] += month_totals[0]
+                totals[1] += month_totals[1]
+        return self.summarize(totals)
+
+    # Function that totals a set of slots, whole categories are read from the per-category totals
+    def slots_summary(self, slots=(), category_ids=()):
+        totals = [0.0, 0.0]
+        for category_id in category_ids:
+            category_totals = self.by_category.get(category_id, (0.0, 0.0))
+            totals[0] += category_totals[0]
+            totals[1] += category_totals[1]
+        amounts, types = self.store.amounts, self.store.types
+        numpy = load_numpy() if len(slots) > 65536 else None
+        if numpy is not None:
+            selected = numpy.asarray(slots, dtype=numpy.int64)
+            type_totals = numpy.bincount(numpy.frombuffer(types, dtype=numpy.int8)[selected],
+                                         weights=numpy.frombuffer(amounts, dtype=numpy.float64)[selected], minlength=2)
+            totals[0] += float(type_totals[0])
+            totals[1] += float(type_totals[1])
+        else:
+            for slot in slots:
+                totals[types[slot]] += amounts[slot]
+        return self.summarize(totals)
+
+
+# Class that keeps transactions in typed columns instead of one dictionary per transaction
+class TransactionStore:
+    def __init__(self):
+        self.amounts = array("d")  # Amount of every slot
+        self.dates = array("i")  # Date of every slot as a day ordinal
+        self.types = array("b")  # Position of the type in TRANSACTION_TYPES
+        self.category_ids = array("i")  # Interned category id of every slot
+        self.ids = array("q")  # Stable id of every slot, saved with the ledger, 0 until fill_missing_ids
+        self.alive = bytearray()  # 1 for live slots, 0 for deleted ones
+        self.category_names = []  # Category id -> category name
+        self.category_lookup = {}  # Category name -> category id
+        self.category_slots = []  # Category id -> slots in insertion order, deleted ones until compact_slots
+        self.count = 0  # Number of live transactions
+        self.next_id = 1  # Id of the next new transaction
+        self.deleted = 0  # Deleted slots still in the columns, dropped by compact_slots
+        self.compact_after = 4096  # Deleted slots that trigger compact_slots once they are a quarter of all slots
+        self._id_slots = None  # Id -> slot of the live transactions, built on first lookup by id
+        self._indexes = None  # Secondary indexes, built on first search
+        self._totals = None  # Running totals, built on first summary
+        self._sort_cache = {}  # Column -> (version, slots sorted by that column)
+        self.version = 0  # Increased by every change, cached results of older versions are stale
+        self.load_error = None  # Why the ledger file could not be loaded, such a store is never saved
+        self.invalid_rows = []  # (category, transaction) read from the file but unusable, saved back unchanged
+
+    # Secondary indexes, maintained incrementally once they have been built
+    @property
+    def indexes(self):
+        if self._indexes is None:
+            self._indexes = TransactionIndexes(self)
+        return self._indexes
+
+    # Running totals, maintained incrementally once they have been built
+    @property
+    def totals(self):
+        if self._totals is None:
+            self._totals = TransactionTotals(self)
+        return self._totals
+
+    # Function that builds the indexes and running totals that are missing, so the thread that changed the store
+    # pays for them instead of the first search
+    def build_indexes(self):
+        return self.indexes, self.totals
+
+    # Function that drops the indexes before a large batch of changes, they are rebuilt on the next search
+    def drop_indexes(self):
+        self._indexes = None
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, category):
+        category_id = self.category_lookup.get(category)
+        return category_id is not None and any(map(self.alive.__getitem__, self.category_slots[category_id]))
+
+    def clear(self):
+        version = self.version
+        self.__init__()
+        self.version = version + 1
+
+    def intern_category(self, category):
+        category_id = self.category_lookup.get(category)
+        if category_id is None:
+            category_id = len(self.category_names)
+            self.category_lookup[category] = category_id
+            self.category_names.append(category)
+            self.category_slots.append(array("q"))
+        return category_id
+
+    # Function that gives ids to the slots appended last, ids holds the saved ids (0 for none) or is None for new ones
+    def assign_ids(self, count, ids=None):
+        first_slot = len(self.ids)
+        if ids is None:
+            self.ids.extend(range(self.next_id, self.next_id + count))
+            self.next_id += count
+        else:
+            self.ids.extend(ids)
+            if count:
+                self.next_id = max(self.next_id, max(ids) + 1)
+        if self._id_slots is not None:
+            self._id_slots.update(zip(self.ids[first_slot:], range(first_slot, first_slot + count)))
+
+    # Function that gives new ids to loaded transactions that were saved without one, in file order
+    def fill_missing_ids(self):
+        if 0 in self.ids:
+            for slot, transaction_id in enumerate(self.ids):
+                if transaction_id == 0:
+                    self.ids[slot] = self.next_id
+                    self.next_id += 1
+            self._id_slots = None
+
+    # Function that returns the slot of a live transaction id, or None
+    def slot_of(self, transaction_id):
+        if self._id_slots is None:
+            self._id_slots = dict(zip(itertools.compress(self.ids, self.alive), self.slots()))
+        return self._id_slots.get(transaction_id)
+
+    def add(self, transaction_type, category, amount, date, transaction_id=None):
+        type_code = TRANSACTION_TYPES.index(transaction_type.lower())
+        ordinal = date_to_ordinal(date)
+        category_id = self.intern_category(category)
+        slot = len(self.amounts)
+        self.amounts.append(float(amount))
+        self.dates.append(ordinal)
+        self.types.append(type_code)
+        self.category_ids.append(category_id)
+        self.assign_ids(1, None if transaction_id is None else (transaction_id,))
+        self.alive.append(1)
+        self.category_slots[category_id].append(slot)
+        self.count += 1
+        self.version += 1
+        if self._indexes is not None:
+            self._indexes.add(slot)
+        if self._totals is not None:
+            self._totals.add(slot)
+        return slot
+
+    # Function that appends already validated (type code, category, amount, date ordinal) rows in bulk
+    def extend(self, rows):
+        first_slot = len(self.amounts)
+        category_ids = [self.intern_category(row[1]) for row in rows]
+        self.types.extend([row[0] for row in rows])
+        self.amounts.extend([row[2] for row in rows])
+        self.dates.extend([row[3] for row in rows])
+        self.category_ids.extend(category_ids)
+        self.assign_ids(len(rows))
+        self.alive.extend(b"\x01" * len(rows))
+        for slot, category_id in enumerate(category_ids, first_slot):
+            self.category_slots[category_id].append(slot)
+        self.count += len(rows)
+        self.version += 1
+        self._indexes = None  # Rebuilt on the next search, cheaper than inserting a whole batch
+        if self._totals is not None:
+            for slot in range(first_slot, len(self.amounts)):
+                self._totals.add(slot)
+
+    # Function that appends whole type, amount and date ordinal columns to one category, with new ids unless
+    # the saved ids are given
+    def extend_category(self, category, types, amounts, dates, ids=None):
+        category_id = self.intern_category(category)
+        first_slot = len(self.amounts)
+        self.types.extend(types)
+        self.amounts.extend(amounts)
+        self.dates.extend(dates)
+        self.category_ids.extend(array("i", [category_id]) * len(amounts))
+        self.assign_ids(len(amounts), ids)
+        self.alive.extend(b"\x01" * len(amounts))
+        self.category_slots[category_id].extend(range(first_slot, len(self.amounts)))
+        self.count += len(amounts)
+        self.version += 1
+        self._indexes = None
+        if self._totals is not None:
+            for slot in range(first_slot, len(self.amounts)):
+                self._totals.add(slot)
+
+    # Function that appends every transaction of another store, category by category
+    def merge(self, other):
+        for category, slots in other.live_categories():
+            self.extend_category(category, array("b", [other.types[slot] for slot in slots]),
+                                     array("d", [other.amounts[slot] for slot in slots]),
+                                     array("i", [other.dates[slot] for slot in slots]))
+
+    # Function that appends every row of a BinarySnapshot, copying its columns in bulk
+    def load_binary(self, snapshot):
+        first_slot = len(self.amounts)
+        for column, view in ((self.amounts, snapshot.amounts), (self.dates, snapshot.dates),
+                             (self.types, snapshot.types)):
+            values = array(column.typecode)
+            with view.cast("B") as raw:
+                values.frombytes(raw)
+            if sys.byteorder == "big":
+                values.byteswap()  # Snapshots are little-endian
+            column.extend(values)
+        ids = array("q")
+        with snapshot.ids.cast("B") as raw:
+            ids.frombytes(raw)
+        if sys.byteorder == "big":
+            ids.byteswap()
+        self.assign_ids(snapshot.row_count, ids)
+        for category, first_row, row_count in snapshot.categories:
+            category_id = self.intern_category(category)
+            self.category_ids.extend(array("i", [category_id]) * row_count)
+            self.category_slots[category_id].extend(range(first_slot + first_row, first_slot + first_row + row_count))
+        self.alive.extend(b"\x01" * snapshot.row_count)
+        self.count += snapshot.row_count
+        self.version += 1
+        self._indexes = None
+        if self._totals is not None:
+            for slot in range(first_slot, len(self.amounts)):
+                self._totals.add(slot)
+
+    def update(self, slot, transaction_type=None, amount=None, date=None):
+        if not self.alive[slot]:
+            raise KeyError(f"Transaction slot {slot} has been deleted")
+        type_code = TRANSACTION_TYPES.index(transaction_type.lower()) if transaction_type is not None else None
+        ordinal = date_to_ordinal(date) if date is not None else None
+        amount = float(amount) if amount is not None else None
+        if self._indexes is not None:
+            self._indexes.remove(slot)
+        if self._totals is not None:
+            self._totals.remove(slot)
+        if type_code is not None:
+            self.types[slot] = type_code
+        if amount is not None:
+            self.amounts[slot] = amount
+        if ordinal is not None:
+            self.dates[slot] = ordinal
+        self.version += 1
+        if self._indexes is not None:
+            self._indexes.add(slot)
+        if self._totals is not None:
+            self._totals.add(slot)
+
+    def delete(self, slot):
+        if self.alive[slot]:
+            if self._totals is not None:
+                self._totals.remove(slot)
+            self.alive[slot] = 0  # The slot stays in category_slots and the indexes until compact_slots
+            if self._id_slots is not None:
+                del self._id_slots[self.ids[slot]]
+            self.count -= 1
+            self.deleted += 1
+            self.version += 1
+            if self.deleted >= self.compact_after and self.deleted * 4 >= len(self.alive):
+                self.compact_slots()
+
+    # Function that drops deleted slots from the columns. Live slots are renumbered in order, so slots held
+    # from before are stale once the version has changed, while ids stay the same.
+    def compact_slots(self):
+        live = self.slots()
+        for name in ("amounts", "dates", "types", "category_ids", "ids"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, map(column.__getitem__, live)))
+        self.alive = bytearray(b"\x01") * len(live)
+        self.category_slots = [array("q") for _ in self.category_names]
+        for slot, category_id in enumerate(self.category_ids):
+            self.category_slots[category_id].append(slot)
+        self.deleted = 0
+        self._id_slots = None
+        self._indexes = None
+        self._sort_cache = {}
+        self.version += 1
+
+    # Function that returns a copy of the columns, without the indexes and totals
+    def copy(self):
+        store = TransactionStore()
+        store.amounts, store.dates, store.types = self.amounts[:], self.dates[:], self.types[:]
+        store.category_ids, store.alive = self.category_ids[:], self.alive[:]
+        store.ids, store.next_id, store.deleted = self.ids[:], self.next_id, self.deleted
+        store.category_names = self.category_names[:]
+        store.category_lookup = dict(self.category_lookup)
+        store.category_slots = [slots[:] for slots in self.category_slots]
+        store.count = self.count
+        store.invalid_rows = self.invalid_rows[:]
+        return store
+
+    # Function that returns a transaction in the dictionary shape used by the JSON file
+    def transaction(self, slot):
+        return {"id": self.ids[slot], "type": TRANSACTION_TYPES[self.types[slot]], "amount": self.amounts[slot],
+                "date": ordinal_to_date(self.dates[slot])}
+
+    def category(self, slot):
+        return self.category_names[self.category_ids[slot]]
+
+    # Function that returns (amount, date, type, category) for a slot
+    def row(self, slot):
+        return (self.amounts[slot], ordinal_to_date(self.dates[slot]), TRANSACTION_TYPES[self.types[slot]],
+                self.category_names[self.category_ids[slot]])
+
+    def slots(self):
+        return array("q", itertools.compress(range(len(self.alive)), self.alive))
+
+    # Function that returns the live slots sorted ascending by a GUI column, cached until the next change.
+    # Amount and Date come from the sorted indexes, Type and Category concatenate the per-type and per-category slots.
+    def sort_permutation(self, column):
+        cached = self._sort_cache.get(column)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        if column == "Amount":
+            permutation = self.indexes.live(self.indexes.amount_index.slots[:])
+        elif column == "Date":
+            permutation = self.indexes.live(self.indexes.date_index.slots[:])
+        elif column == "Type":
+            permutation = array("q")
+            for transaction_type in sorted(TRANSACTION_TYPES):
+                permutation.extend(self.indexes.type_slots(transaction_type))
+        else:
+            permutation = array("q")
+            for category_id in sorted(range(len(self.category_names)), key=self.category_names.__getitem__):
+                permutation.extend(self.live_category_slots(category_id))
+        self._sort_cache[column] = (self.version, permutation)
+        return permutation
+
+    # Function that returns the live slots of a category in insertion order
+    def live_category_slots(self, category_id):
+        slots = self.category_slots[category_id]
+        if not self.deleted:
+            return slots
+        return array("q", itertools.compress(slots, map(self.alive.__getitem__, slots)))
+
+    # Function that yields (category, live slots) for every category that has live transactions
+    def live_categories(self):
+        for category_id, category in enumerate(self.category_names):
+            slots = self.live_category_slots(category_id)
+            if slots:
+                yield category, slots
+
+    def categories(self):
+        return [name for name, _ in self.live_categories()]
+
+    def slots_for_category(self, category):
+        category_id = self.category_lookup.get(category)
+        return self.live_category_slots(category_id) if category_id is not None else array("q")
+
+    # Function that yields (category, transaction) pairs grouped by category
+    def items(self):
+        for category, slots in self.live_categories():
+            for slot in slots:
+                yield category, self.transaction(slot)
+
+    # Function that rebuilds the category -> list of transactions dictionary stored in the JSON file
+    def group_by_category(self):
+        grouped = {category: [self.transaction(slot) for slot in slots] for category, slots in self.live_categories()}
+        for category, transaction in self.invalid_rows:
+            grouped.setdefault(category, []).append(transaction)
+        return grouped
+
+    # Function that appends the transactions of a category -> list of transactions dictionary. Transactions without
+    # an id get 0, fill_missing_ids numbers them once the whole file is loaded. Transactions that cannot be parsed
+    # are kept in invalid_rows, it returns (category, position, reason) for each of them.
+    def load_dict(self, data):
+        bad_rows = []
+        for category, transactions_list in data.items():
+            try:
+                columns = (array("b", [TRANSACTION_TYPES.index(transaction["type"].lower())
+                                       for transaction in transactions_list]),
+                           array("d", [float(transaction["amount"]) for transaction in transactions_list]),
+                           array("i", [date_to_ordinal(transaction["date"]) for transaction in transactions_list]),
+                           array("q", [int(transaction.get("id", 0)) for transaction in transactions_list]))
+            except (KeyError, ValueError, TypeError, AttributeError):
+                # Parse the category again one transaction at a time, keeping the valid ones
+                columns = (array("b"), array("d"), array("i"), array("q"))
+                for position, transaction in enumerate(transactions_list):
+                    try:
+                        row = (TRANSACTION_TYPES.index(transaction["type"].lower()), float(transaction["amount"]),
+                               date_to_ordinal(transaction["date"]), int(transaction.get("id", 0)))
+                    except (KeyError, ValueError, TypeError, AttributeError) as e:
+                        bad_rows.append((category, position, f"{type(e).__name__}: {e}"))
+                        self.invalid_rows.append((category, transaction))
+                        with contextlib.suppress(KeyError, ValueError, TypeError, AttributeError):
+                            self.next_id = max(self.next_id, int(transaction["id"]) + 1)  # Keep its id unused
+                        continue
+                    for column, value in zip(columns, row):
+                        column.append(value)
+            self.extend_category(category, *columns)
+        return bad_rows
+
+
+# Snapshot of the ledger, the journal is stored next to it. A .ftb name selects the binary snapshot format.
+TRANSACTIONS_FILE = os.environ.get("FINANCE_TRACKER_LEDGER", "transactions.json")
+
+# Exception raised inside a background task once it has been cancelled
+class TaskCancelled(Exception):
+    pass
+
+
+# Class that runs one task at a time on a worker thread. The task reports progress and sees cancellation through
+# the worker, and its outcome is queued so poll() can run the callbacks on the thread that owns the GUI.
+class BackgroundWorker:
+    def __init__(self):
+        self.messages = queue.Queue()
+        self.cancelled = threading.Event()
+        self.busy = False
+        self.callbacks = {}
+
+    def submit(self, function, on_done, on_error=None, on_progress=None, on_cancelled=None):
+        if self.busy:
+            raise RuntimeError("A background task is already running")
+        self.busy = True
+        self.cancelled.clear()
+        self.callbacks = {"done": on_done, "error": on_error, "progress": on_progress, "cancelled": on_cancelled}
+        threading.Thread(target=self.run, args=(function,), daemon=True).start()
+
+    def run(self, function):
+        try:
+            self.messages.put(("done", function(self)))
+        except TaskCancelled:
+            self.messages.put(("cancelled", None))
+        except Exception as e:
+            self.messages.put(("error", e))
+
+    # Function called by the task to report progress, it raises TaskCancelled once the task has been cancelled
+    def progress(self, fraction, message=""):
+        if self.cancelled.is_set():
+            raise TaskCancelled()
+        self.messages.put(("progress", (fraction, message)))
+
+    def cancel(self):
+        self.cancelled.set()
+
+    # Function that runs the callbacks for the queued messages, a cancelled task's result is dropped
+    def poll(self):
+        while True:
+            try:
+                kind, value = self.messages.get_nowait()
+            except queue.Empty:
+                return
+            if kind != "progress":
+                self.busy = False
+                if kind == "done" and self.cancelled.is_set():
+                    kind = "cancelled"
+            callback = self.callbacks.get(kind)
+            if kind == "progress":
+                if callback is not None:
+                    callback(*value)
+            elif kind == "cancelled":
+                if callback is not None:
+                    callback()
+            elif callback is not None:
+                callback(value)
+
+
+# Function that returns the first and last day ordinals of the dates starting with a partly typed YYYY-MM-DD prefix,
+# and whether the range covers whole months. It returns None when no date can start with the prefix.
+def date_prefix_range(prefix):
+    match = re.fullmatch(r"(\d{1,4})(?:(?<=\d{4})-(\d{0,2})(?:(?<=-\d{2})-(\d{0,2}))?)?", prefix)
+    if match is None:
+        return None
+    year, month, day = match.groups()
+    first_year, last_year = max(1, int(year.ljust(4, "0"))), int(year.ljust(4, "9"))
+    first_month, last_month = max(1, int((month or "").ljust(2, "0"))), min(12, int((month or "").ljust(2, "9")))
+    if first_month > last_month:
+        return None
+    last_day_of_month = calendar.monthrange(last_year, last_month)[1]
+    first_day, last_day = max(1, int((day or "").ljust(2, "0"))), min(last_day_of_month, int((day or "").ljust(2, "9")))
+    if first_day > last_day:
+        return None
+    return (datetime.date(first_year, first_month, first_day).toordinal(),
+            datetime.date(last_year, last_month, last_day).toordinal(), not day)
+
+
+# Class that answers search-as-you-type queries. Results are kept in an LRU cache that holds at most max_cached_slots
+# slots and is emptied when the store changes, and a query that extends the previous one narrows the previous result
+# instead of searching the whole store.
+# Categories and dates match by prefix, types by the start of their name and amounts like the Search button.
+class IncrementalSearch:
+    def __init__(self, store, max_cached_slots=1000000):
+        self.store = store
+        self.cache = collections.OrderedDict()  # (criteria, query) -> (slots, summary, narrowing state)
+        self.cache_version = store.version  # Store version of the cached results
+        self.max_cached_slots = max_cached_slots  # Slots held by all cached results together
+        self.cached_slots = 0
+        self.last = None  # (criteria, query, version, result) of the previous search
+
+    # Function that returns (slots, summary) for a query, or None while the query cannot be searched yet
+    def search(self, criteria, query):
+        store = self.store
+        query = query.strip().casefold()
+        if self.cache_version != store.version:
+            self.cache.clear()  # Results of an older version are stale
+            self.cached_slots = 0
+            self.cache_version = store.version
+        key = (criteria, query)
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+        else:
+            previous = None
+            if self.last is not None and self.last[0] == criteria and self.last[2] == store.version \
+                    and query.startswith(self.last[1]):
+                previous = self.last[3]
+            result = self.compute(criteria, query, previous)
+            if result is None:
+                return None
+            self.cache[key] = result
+            self.cached_slots += len(result[0])
+            while self.cached_slots > self.max_cached_slots:
+                self.cached_slots -= len(self.cache.popitem(last=False)[1][0])
+        self.last = (criteria, query, store.version, result)
+        return result[0], result[1]
+
+    # Function that returns (slots, summary, narrowing state), previous is the result of a shorter query or None
+    def compute(self, criteria, query, previous):
+        store = self.store
+        if criteria == "Type":
+            matches = [transaction_type for transaction_type in TRANSACTION_TYPES if transaction_type.startswith(query)]
+            if len(matches) != 1:
+                return (array("q"), store.totals.summarize((0.0, 0.0)), None) if not matches else None
+            if previous is not None and previous[2] == matches[0]:
+                return previous  # A longer prefix of the same type name has the same result
+            type_code = TRANSACTION_TYPES.index(matches[0])
+            type_totals = [0.0, 0.0]
+            type_totals[type_code] = store.totals.totals[type_code]
+            return store.indexes.type_slots(matches[0]), store.totals.summarize(type_totals), matches[0]
+        if criteria == "Category":
+            prefix = query.rstrip("*")
+            if previous is not None:
+                # Every category matching the longer prefix also matched the previous one
+                category_ids = [category_id for category_id in previous[2]
+                                if store.category_names[category_id].casefold().startswith(prefix)]
+            else:
+                category_ids = store.indexes.category_ids_with_prefix(prefix)
+            slots = array("q")
+            for category_id in category_ids:
+                slots.extend(store.live_category_slots(category_id))
+            return slots, store.totals.slots_summary(category_ids=category_ids), category_ids
+        if criteria == "Amount":
+            try:
+                low, _, high = query.partition("..")
+                low, high = float(low), float(high or low)
+            except ValueError:
+                return None
+            slots = store.indexes.amount_between(low, high)
+            return slots, store.totals.slots_summary(slots), None
+        if ".." in query:
+            try:
+                start_date, end_date = query.split("..")
+                slots = store.indexes.date_between(start_date, end_date)
+            except ValueError:
+                return None
+            return slots, store.totals.slots_summary(slots), None
+        date_range = date_prefix_range(query)
+        if date_range is None:
+            return None
+        first_day, last_day, whole_months = date_range
+        date_index = store.indexes.date_index
+        if previous is not None:
+            start, end = date_index.span(first_day, last_day, *previous[2])  # Bisect only inside the previous result
+        else:
+            start, end = date_index.span(first_day, last_day)
+        slots = store.indexes.live(date_index.slots[start:end])
+        if whole_months:
+            summary = store.totals.months_summary(ordinal_to_date(first_day)[:7], ordinal_to_date(last_day)[:7])
+        else:
+            summary = store.totals.slots_summary(slots)
+        return slots, summary, (start, end)
+
+
+# Function that validates a query and returns a function computing (slots, summary) from the store indexes.
+# "low..high" searches a range of amounts or dates, a YYYY-MM date searches a whole month and a category
+# ending with * searches by prefix.
+def prepare_search(store, criteria, query):
+    if criteria == "Amount":
+        try:
+            low, _, high = query.partition("..")
+            low, high = float(low), float(high or low)
+        except ValueError:
+            raise ValueError("Amount must be a numeric value.")
+
+        def search():
+            slots = store.indexes.amount_between(low, high)
+            return slots, store.totals.slots_summary(slots)
+    elif criteria == "Type":
+        if query.lower() not in ["income", "expense"]:
+            raise ValueError("Transaction type must be 'Income' or 'Expense'.")
+        type_code = TRANSACTION_TYPES.index(query)
+
+        def search():
+            type_totals = [0.0, 0.0]
+            type_totals[type_code] = store.totals.totals[type_code]
+            return store.indexes.type_slots(query), store.totals.summarize(type_totals)
+    elif criteria == "Category":
+        def search():
+            if query.endswith("*"):
+                category_ids = store.indexes.category_ids_with_prefix(query[:-1])
+            else:
+                category_ids = store.indexes.category_ids(query)
+            slots = [slot for category_id in category_ids for slot in store.live_category_slots(category_id)]
+            return slots, store.totals.slots_summary(category_ids=category_ids)
+    else:
+        try:
+            if len(query) == 7:
+                month = datetime.datetime.strptime(query, '%Y-%m')
+
+                def search():
+                    return store.indexes.month(month.year, month.month), store.totals.month_summary(query)
+            else:
+                start_date, _, end_date = query.partition("..")
+                end_date = end_date or start_date
+                for date in (start_date, end_date):
+                    datetime.datetime.strptime(date, '%Y-%m-%d')
+
+                def search():
+                    slots = store.indexes.date_between(start_date, end_date)
+                    return slots, store.totals.slots_summary(slots)
+        except ValueError:
+            raise ValueError("Invalid date format. Please use YYYY-MM-DD.")
+    return search
+
+
+# Function that imports NumPy when it is installed, the analytics fall back to plain Python without it
+@functools.lru_cache(maxsize=None)
+def load_numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+# Class that holds the result of analyze_transactions, shared by the CLI summary and the GUI summary panel
+class LedgerReport:
+    def __init__(self):
+        self.total_income = 0.0
+        self.total_expense = 0.0
+        self.net_balance = 0.0
+        self.count = 0
+        self.first_date = None  # Earliest date in the report, None when it is empty
+        self.last_date = None
+        self.by_type = {}  # Type -> total
+        self.by_category = []  # {"category", "type", "total", "count", "first_date", "last_date"} per category and type
+        self.by_month = []  # {"month", "income", "expense", "net"} in month order
+        self.by_year = []  # {"year", "income", "expense", "net"} in year order
+        self.running_balance = []  # (date, balance) at the end of every day with transactions
+        self.top_income_categories = []  # (category, total) with the largest income first
+        self.top_expense_categories = []  # (category, total) with the largest expense first
+
+
+# Function that groups the selected rows by (category, type) and by day with NumPy, without a Python loop per row.
+# It returns the per category and type totals, counts, first and last ordinals and a day -> [income, expense] map.
+def group_transactions_numpy(numpy, store, start, end, category_ids):
+    amounts = numpy.frombuffer(store.amounts, dtype=numpy.float64)
+    dates = numpy.frombuffer(store.dates, dtype=numpy.int32)
+    types = numpy.frombuffer(store.types, dtype=numpy.int8).astype(numpy.int64)
+    categories = numpy.frombuffer(store.category_ids, dtype=numpy.int32).astype(numpy.int64)
+    selected = numpy.frombuffer(store.alive, dtype=numpy.uint8).astype(bool)
+    if start is not None:
+        selected &= dates >= start
+    if end is not None:
+        selected &= dates <= end
+    if category_ids is not None:
+        selected &= numpy.isin(categories, list(category_ids))
+    if not selected.all():
+        amounts, dates, types, categories = amounts[selected], dates[selected], types[selected], categories[selected]
+    groups = 2 * len(store.category_names)
+    group = categories * 2 + types
+    totals = numpy.bincount(group, weights=amounts, minlength=groups).tolist()
+    counts = numpy.bincount(group, minlength=groups)
+    first = numpy.full(groups, numpy.iinfo(numpy.int32).max, dtype=numpy.int32)
+    last = numpy.full(groups, numpy.iinfo(numpy.int32).min, dtype=numpy.int32)
+    numpy.minimum.at(first, group, dates)
+    numpy.maximum.at(last, group, dates)
+    present = counts > 0
+    first = [int(ordinal) if found else None for ordinal, found in zip(first.tolist(), present.tolist())]
+    last = [int(ordinal) if found else None for ordinal, found in zip(last.tolist(), present.tolist())]
+    counts = counts.tolist()
+    if len(dates):
+        first_day = int(dates.min())
+        span = int(dates.max()) - first_day + 1
+        day_totals = numpy.bincount((dates - first_day) * 2 + types, weights=amounts, minlength=2 * span)
+        active_days = numpy.flatnonzero(numpy.bincount(dates - first_day, minlength=span))
+        daily = {first_day + day: day_total for day, day_total in
+                 zip(active_days.tolist(), day_totals.reshape(span, 2)[active_days].tolist())}
+    else:
+        daily = {}
+    return totals, counts, first, last, daily
+
+
+# Function that does the same grouping as group_transactions_numpy in a single pass over the columns
+def group_transactions_python(store, start, end, category_ids):
+    groups = 2 * len(store.category_names)
+    totals = [0.0] * groups
+    counts = [0] * groups
+    first = [None] * groups
+    last = [None] * groups
+    daily = {}
+    start = -1 if start is None else start
+    end = 1 << 31 if end is None else end
+    for amount, ordinal, type_code, category_id, alive in zip(store.amounts, store.dates, store.types,
+                                                              store.category_ids, store.alive):
+        if not alive or ordinal < start or ordinal > end or (category_ids is not None and
+                                                             category_id not in category_ids):
+            continue
+        group = category_id * 2 + type_code
+        totals[group] += amount
+        counts[group] += 1
+        if first[group] is None or ordinal < first[group]:
+            first[group] = ordinal
+        if last[group] is None or ordinal > last[group]:
+            last[group] = ordinal
+        day = daily.get(ordinal)
+        if day is None:
+            day = daily[ordinal] = [0.0, 0.0]
+        day[type_code] += amount
+    return totals, counts, first, last, daily
+
+
+# Function that computes totals by type, category, month and year, the running balance and the top categories.
+# start_date and end_date (YYYY-MM-DD, both included) and categories limit the transactions taken into account.
+def analyze_transactions(store, start_date=None, end_date=None, categories=None, top=5, use_numpy=True):
+    start = date_to_ordinal(start_date) if start_date else None
+    end = date_to_ordinal(end_date) if end_date else None
+    category_ids = None
+    if categories is not None:
+        category_ids = {store.category_lookup[category] for category in categories if category in store.category_lookup}
+    numpy = load_numpy() if use_numpy else None
+    if numpy is not None:
+        totals, counts, first, last, daily = group_transactions_numpy(numpy, store, start, end, category_ids)
+    else:
+        totals, counts, first, last, daily = group_transactions_python(store, start, end, category_ids)
+
+    report = LedgerReport()
+    category_totals = {}
+    for group, count in enumerate(counts):
+        if count:
+            category, transaction_type = store.category_names[group // 2], TRANSACTION_TYPES[group % 2]
+            report.by_category.append({"category": category, "type": transaction_type, "total": round(totals[group], 2),
+                                       "count": count, "first_date": ordinal_to_date(first[group]),
+                                       "last_date": ordinal_to_date(last[group])})
+            category_totals.setdefault(transaction_type, []).append((category, round(totals[group], 2)))
+            report.count += count
+    for type_code, transaction_type in enumerate(TRANSACTION_TYPES):
+        report.by_type[transaction_type] = round(sum(totals[type_code::2]), 2)
+    report.total_income, report.total_expense = report.by_type["income"], report.by_type["expense"]
+    report.net_balance = round(report.total_income - report.total_expense, 2)
+    report.top_income_categories = sorted(category_totals.get("income", []), key=lambda item: -item[1])[:top]
+    report.top_expense_categories = sorted(category_totals.get("expense", []), key=lambda item: -item[1])[:top]
+
+    months = {}
+    years = {}
+    balance = 0.0
+    for ordinal in sorted(daily):
+        income, expense = daily[ordinal]
+        date = ordinal_to_date(ordinal)
+        for rollup, key in ((months, date[:7]), (years, date[:4])):
+            period = rollup.get(key)
+            if period is None:
+                period = rollup[key] = [0.0, 0.0]
+            period[0] += income
+            period[1] += expense
+        balance += income - expense
+        report.running_balance.append((date, round(balance, 2)))
+    report.by_month = [{"month": month, "income": round(income, 2), "expense": round(expense, 2),
+                        "net": round(income - expense, 2)} for month, (income, expense) in months.items()]
+    report.by_year = [{"year": year, "income": round(income, 2), "expense": round(expense, 2),
+                       "net": round(income - expense, 2)} for year, (income, expense) in years.items()]
+    if report.running_balance:
+        report.first_date, report.last_date = report.running_balance[0][0], report.running_balance[-1][0]
+    return report
+
 
 # Function to view transactions using GUI
-transactions = {}
+transactions = TransactionStore()
+journal = None  # TransactionJournal of the ledger once it has been opened
 def view_transactions_using_GUI():
+    import tkinter as tk  # Import the tkinter module for GUI, only when the GUI is opened
+    from tkinter import ttk  # Import themed tkinter widgets
+    from tkinter import messagebox  # Import messagebox for displaying messages
+    from tkinter import filedialog  # Import filedialog for choosing files to import
+
     # Define a class for the Finance Tracker GUI
     class FinanceTrackerGUI:
         def __init__(self, root, transactions):
             self.root = root
             self.transactions = transactions
             self.order = {}
+            self.rows = []  # Row model backing the virtual Treeview
+            self.first_row = 0  # Index of the row shown at the top of the viewport
+            self.visible_rows = 1  # Number of rows that fit in the viewport
+            self.selected_id = None  # Id of the selected transaction, the Treeview items are reused for other rows
+            self.worker = BackgroundWorker()  # Runs loading, saving, importing and searching off the Tk thread
+            self.polling = False  # True while poll_worker is scheduled
+            self.loading = False  # True while the worker fills the store, which must not be read meanwhile
+            self.live_search = IncrementalSearch(transactions)  # Answers the search-as-you-type queries
+            self.live_search_job = None  # Pending debounced search, from root.after
             self.root.title("Personal Finance Tracker")
+            if instrumentation is not None:
+                instrumentation.instrument_gui(self)
             self.create_widgets()
 
         def create_widgets(self):
@@ -38,25 +1031,59 @@ def view_transactions_using_GUI():
             self.search_criteria.set("Amount")
             self.search_criteria.grid(row=0, column=3, padx=5, pady=5)
 
+            # Search as you type, once typing pauses
+            self.search_entry.bind("<KeyRelease>", self.schedule_live_search)
+            self.search_entry.bind("<Return>", lambda event: self.run_live_search())
+            self.search_criteria.bind("<<ComboboxSelected>>", self.schedule_live_search)
+
             search_button = ttk.Button(self.search_frame, text="Search", command=self.perform_search, style="TButton")
             search_button.grid(row=0, column=4, padx=5, pady=5)
 
             reset_button = ttk.Button(self.search_frame, text="Reset", command=self.reset_search, style="TButton")
             reset_button.grid(row=0, column=5, padx=5, pady=5)
 
+            import_button = ttk.Button(self.search_frame, text="Import...", command=self.import_file, style="TButton")
+            import_button.grid(row=0, column=6, padx=5, pady=5)
+
+            save_button = ttk.Button(self.search_frame, text="Save", command=self.save_ledger, style="TButton")
+            save_button.grid(row=0, column=7, padx=5, pady=5)
+
+            summary_button = ttk.Button(self.search_frame, text="Summary", command=self.show_summary, style="TButton")
+            summary_button.grid(row=0, column=8, padx=5, pady=5)
+
+            edit_button = ttk.Button(self.search_frame, text="Edit...", command=self.edit_selected, style="TButton")
+            edit_button.grid(row=0, column=9, padx=5, pady=5)
+
+            delete_button = ttk.Button(self.search_frame, text="Delete", command=self.delete_selected, style="TButton")
+            delete_button.grid(row=0, column=10, padx=5, pady=5)
+
             self.tree_frame = ttk.Frame(self.root)
             self.tree_frame.pack(fill="both", expand=True)
 
-            self.tree = ttk.Treeview(self.tree_frame, columns=("Amount", "Date", "Type", "Category",), show="headings")
+            self.tree = ttk.Treeview(self.tree_frame, columns=("ID", "Amount", "Date", "Type", "Category",),
+                                     show="headings")
+            self.tree.heading("ID", text="ID")
+            self.tree.column("ID", width=80)
             self.tree.heading("Amount", text="Amount", command=lambda: self.sort_by("Amount"))
             self.tree.heading("Date", text="Date", command=lambda: self.sort_by("Date"))
             self.tree.heading("Type", text="Type", command=lambda: self.sort_by("Type"))
             self.tree.heading("Category", text="Category", command=lambda: self.sort_by("Category"))
             self.tree.pack(side="left", fill="both", expand=True)
 
-            scrollbar = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.tree.yview)
-            scrollbar.pack(side="right", fill="y")
-            self.tree.configure(yscrollcommand=scrollbar.set)
+            # The Treeview only ever holds the rows visible in the viewport, the scrollbar drives the row model
+            self.scrollbar = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.on_scrollbar)
+            self.scrollbar.pack(side="right", fill="y")
+            self.tree.bind("<Configure>", self.on_tree_resize)
+            self.tree.bind("<MouseWheel>", self.on_mouse_wheel)
+            self.tree.bind("<Button-4>", lambda event: self.scroll_rows(-3))
+            self.tree.bind("<Button-5>", lambda event: self.scroll_rows(3))
+            self.tree.bind("<Prior>", lambda event: self.scroll_rows(-self.visible_rows))
+            self.tree.bind("<Next>", lambda event: self.scroll_rows(self.visible_rows))
+            self.tree.bind("<Up>", lambda event: self.move_selection(-1))
+            self.tree.bind("<Down>", lambda event: self.move_selection(1))
+            self.tree.bind("<<TreeviewSelect>>", self.on_select)
+            self.tree.bind("<Double-1>", lambda event: self.edit_selected())
+            self.tree.bind("<Delete>", lambda event: self.delete_selected())
 
             self.summary_frame = tk.Frame(self.root, background="#DEB887")
             self.summary_frame.pack(fill="both")
@@ -70,6 +1097,19 @@ def view_transactions_using_GUI():
             self.net_balance_label = ttk.Label(self.summary_frame, text="", background="#DEB887", foreground="black")
             self.net_balance_label.grid(row=0, column=2, padx=10)
 
+            self.status_frame = ttk.Frame(self.root)
+            self.status_frame.pack(fill="both")
+
+            self.status_label = ttk.Label(self.status_frame, text="")
+            self.status_label.pack(side="left", padx=5)
+
+            self.cancel_button = ttk.Button(self.status_frame, text="Cancel", command=self.worker.cancel,
+                                            state="disabled")
+            self.cancel_button.pack(side="right", padx=5, pady=2)
+
+            self.progress_bar = ttk.Progressbar(self.status_frame, length=200, maximum=100)
+            self.progress_bar.pack(side="right", padx=5, pady=2)
+
             self.display_transactions()
             self.update_transaction_summary(self.transactions)
 
@@ -90,150 +1130,1692 @@ def view_transactions_using_GUI():
                 messagebox.showerror("Error", "Invalid search criteria.")
                 return
 
-            search_results = {}
-            for category, transactions_list in self.transactions.items():
-                if criteria == "Amount":
-                    try:
-                        query_float = float(query)
-                    except ValueError:
-                        messagebox.showerror("Error", "Amount must be a numeric value.")
-                        return
-                    search_results[category] = [transaction for transaction in transactions_list if
-                                                query_float == transaction["amount"]]
-                elif criteria == "Type":
-                    if query.lower() not in ["income", "expense"]:
-                        messagebox.showerror("Error", "Transaction type must be 'Income' or 'Expense'.")
-                        return
-                    search_results[category] = [transaction for transaction in transactions_list if
-                                                query == transaction["type"].lower()]
-                elif criteria == "Category":
-                    search_results[category] = [transaction for transaction in transactions_list if
-                                                query == category.lower()]
-                elif criteria == "Date":
-                    try:
-                        datetime.datetime.strptime(query, '%Y-%m-%d')
-                    except ValueError:
-                        messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD.")
-                        return
-                    search_results[category] = [transaction for transaction in transactions_list if
-                                                query == transaction["date"].lower()]
+            search = self.build_search(criteria, query)
+            if search is not None:
+                self.run_in_background("Searching...", lambda worker: search(), self.show_search_results)
 
-            if any(search_results.values()):
+        def schedule_live_search(self, event=None):
+            if self.live_search_job is not None:
+                self.root.after_cancel(self.live_search_job)
+            self.live_search_job = self.root.after(150, self.run_live_search)
+
+        # Function that filters the rows while typing. Incomplete queries keep the current rows, and unlike the
+        # Search button no error dialogs are shown.
+        def run_live_search(self):
+            self.live_search_job = None
+            if self.loading:
+                return
+            query = self.search_entry.get().strip()
+            if not query:
+                self.display_transactions()
+                self.update_transaction_summary(self.transactions)
+                self.status_label.config(text="")
+                return
+            result = self.live_search.search(self.search_criteria.get(), query)
+            if result is not None:
+                slots, summary = result
+                self.display_transactions(slots)
+                self.update_summary_labels(*summary)
+                self.status_label.config(text=f"{len(slots)} matching transactions" if slots else
+                                         "No matching transactions found.")
+
+        # Function that returns the search function of prepare_search, or None after showing why the query is invalid
+        def build_search(self, criteria, query):
+            try:
+                return prepare_search(self.transactions, criteria, query)
+            except ValueError as error:
+                messagebox.showerror("Error", str(error))
+                return None
+
+        def show_search_results(self, result):
+            search_results, search_summary = result
+            if search_results:
                 self.display_transactions(search_results)
+                self.update_summary_labels(*search_summary)
             else:
                 messagebox.showinfo("No Results", "No matching transactions found.")
 
+        # Function that runs function(worker) on the background worker and on_done(result) on the Tk thread after it
+        # With changes_store the task may change the store, which the Tk thread then leaves alone until it is over
+        def run_in_background(self, description, function, on_done, cancellable=True, changes_store=False):
+            if self.worker.busy:
+                messagebox.showinfo("Busy", "Please wait for the current operation to finish or cancel it.")
+                return
+            self.status_label.config(text=description)
+            self.progress_bar.config(mode="indeterminate", value=0)
+            self.progress_bar.start(10)
+            self.cancel_button.config(state="normal" if cancellable else "disabled")
+            if changes_store:
+                self.loading = True
+                task = function
+
+                def function(worker):
+                    result = task(worker)
+                    self.transactions.build_indexes()  # On the worker, not on the first search or sort
+                    return result
+
+            def finished(result):
+                if changes_store:
+                    self.loading = False
+                self.finish_task("")
+                on_done(result)
+
+            def failed(error):
+                if changes_store:
+                    self.loading = False
+                self.on_task_error(error)
+
+            def cancelled():
+                if changes_store:
+                    self.loading = False
+                self.finish_task("Cancelled.")
+
+            self.worker.submit(function, on_done=finished, on_error=failed, on_progress=self.on_task_progress,
+                               on_cancelled=cancelled)
+            if not self.polling:
+                self.polling = True
+                self.root.after(50, self.poll_worker)
+
+        def poll_worker(self):
+            self.worker.poll()  # Runs the callbacks of the task on the Tk thread
+            if self.worker.busy:
+                self.root.after(50, self.poll_worker)
+            else:
+                self.polling = False
+
+        def on_task_progress(self, fraction, message):
+            if str(self.progress_bar.cget("mode")) != "determinate":
+                self.progress_bar.stop()
+                self.progress_bar.config(mode="determinate")
+            self.progress_bar.config(value=fraction * 100)
+            if message:
+                self.status_label.config(text=message)
+
+        def on_task_error(self, error):
+            self.finish_task("")
+            messagebox.showerror("Error", str(error))
+
+        def finish_task(self, message):
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate", value=0)
+            self.cancel_button.config(state="disabled")
+            self.status_label.config(text=message)
+
+        # Function that loads the ledger on the worker if it is not loaded yet
+        def load_ledger(self):
+            if journal is not None and journal.loaded:
+                return
+            self.run_in_background("Loading transactions...", lambda worker: ensure_ledger_loaded(),
+                                   lambda result: self.reset_search(), cancellable=False, changes_store=True)
+
+        # Function that applies the changes other processes made to the ledger, it checks again every second.
+        # Appended records are applied right here, only a compaction that cannot be followed reloads the ledger.
+        def watch_ledger(self):
+            self.root.after(1000, self.watch_ledger)
+            if journal is None or not journal.loaded or self.loading or self.worker.busy:
+                return
+            if journal.refresh_is_large():
+                # An import or a compaction by another program, applied on the worker like a reload
+                self.run_in_background("Applying changes made by another program...",
+                                       lambda worker: journal.refresh(), self.on_ledger_changed, cancellable=False,
+                                       changes_store=True)
+            else:
+                self.on_ledger_changed(journal.refresh())  # Skips this tick while another process holds the ledger
+
+        def on_ledger_changed(self, changes):
+            if changes is None:
+                self.reload_ledger()
+            elif changes:
+                self.refresh_view()
+                self.status_label.config(text=f"Applied {changes} changes made by another program.")
+
+        # Function that reloads the ledger on the worker after another program compacted it in a way that cannot be
+        # followed record by record. With retry the user is told that the change they made has to be made again.
+        def reload_ledger(self, retry=False):
+            def reloaded(result):
+                self.refresh_view()
+                if retry:
+                    messagebox.showinfo("Reloaded", "Another program changed the ledger, it has been reloaded. "
+                                                    "Please make your change again.")
+
+            self.run_in_background("Reloading transactions changed by another program...",
+                                   lambda worker: journal.recover(), reloaded, cancellable=False, changes_store=True)
+
+        def save_ledger(self):
+            def saved(result):
+                self.refresh_view()  # Saving first applies the changes of other processes
+                self.status_label.config(text="Transactions saved." if result else "Transactions were not saved.")
+
+            self.run_in_background("Saving transactions...", lambda worker: save_transactions(self.transactions),
+                                   saved, cancellable=False, changes_store=True)
+
+        # Function that tells whether the ledger can be changed, and shows why not when it could not be loaded
+        def ledger_writable(self):
+            if self.transactions.load_error is None:
+                return True
+            messagebox.showerror("Error", "The ledger cannot be changed because it could not be loaded. "
+                                          f"{self.transactions.load_error}")
+            return False
+
+        # Function that imports a bulk file into a separate store on the worker and merges it on the Tk thread
+        def import_file(self):
+            if not self.ledger_writable():
+                return
+            filename = filedialog.askopenfilename(title="Import transactions",
+                                                  filetypes=[("Text files", "*.txt *.csv"), ("All files", "*.*")])
+            if not filename:
+                return
+
+            def import_into_staging(worker):
+                staging = TransactionStore()
+                result = read_bulk_transactions_from_file(
+                    filename, staging,
+                    progress=lambda result, fraction: worker.progress(fraction, f"Imported {result.imported} rows..."))
+                if result is None:
+                    raise FileNotFoundError(f"File {filename} not found.")
+                return staging, result
+
+            def merge(outcome):
+                staging, result = outcome
+                message = f"Imported {result.imported} transactions."
+                if result.bad_row_count:
+                    message += f"\nSkipped {result.bad_row_count} invalid rows, the first one at line " \
+                               f"{result.bad_rows[0][0]}: {result.bad_rows[0][1]}."
+                messagebox.showinfo("Import", message)
+                if result.imported:
+                    def saved(result):
+                        self.reset_search()
+                        if not result:
+                            messagebox.showerror("Import", "The imported transactions could not be saved.")
+
+                    # Merged on the worker once the changes of other processes are in, then saved
+                    self.run_in_background("Saving transactions...",
+                                           lambda worker: save_transactions(self.transactions, merge=staging),
+                                           saved, cancellable=False, changes_store=True)
+
+            self.run_in_background(f"Importing {filename}...", import_into_staging, merge)
+
+        # Function that opens the summary window, the report is computed on the worker
+        def show_summary(self):
+            if self.loading:
+                return
+            window = tk.Toplevel(self.root)
+            window.title("Summary")
+
+            filter_frame = ttk.Frame(window)
+            filter_frame.pack(fill="x")
+            ttk.Label(filter_frame, text="From (YYYY-MM-DD): ").grid(row=0, column=0, padx=5, pady=5)
+            start_entry = ttk.Entry(filter_frame, width=12)
+            start_entry.grid(row=0, column=1, padx=5, pady=5)
+            ttk.Label(filter_frame, text="To (YYYY-MM-DD): ").grid(row=0, column=2, padx=5, pady=5)
+            end_entry = ttk.Entry(filter_frame, width=12)
+            end_entry.grid(row=0, column=3, padx=5, pady=5)
+            totals_label = ttk.Label(window, text="")
+
+            notebook = ttk.Notebook(window)
+            tables = {}
+            for title, columns in (("Categories", ("Category", "Type", "Total", "Count", "First", "Last")),
+                                   ("Months", ("Month", "Income", "Expense", "Net")),
+                                   ("Years", ("Year", "Income", "Expense", "Net")),
+                                   ("Running balance", ("Date", "Balance"))):
+                frame = ttk.Frame(notebook)
+                table = ttk.Treeview(frame, columns=columns, show="headings")
+                for column in columns:
+                    table.heading(column, text=column)
+                    table.column(column, width=100)
+                scrollbar = ttk.Scrollbar(frame, orient="vertical", command=table.yview)
+                table.configure(yscrollcommand=scrollbar.set)
+                table.pack(side="left", fill="both", expand=True)
+                scrollbar.pack(side="right", fill="y")
+                notebook.add(frame, text=title)
+                tables[title] = table
+
+            def show_report(report):
+                if not window.winfo_exists():
+                    return
+                rows = {"Categories": [(entry["category"], entry["type"], entry["total"], entry["count"],
+                                        entry["first_date"], entry["last_date"]) for entry in report.by_category],
+                        "Months": [(month["month"], month["income"], month["expense"], month["net"])
+                                   for month in report.by_month],
+                        "Years": [(year["year"], year["income"], year["expense"], year["net"])
+                                  for year in report.by_year],
+                        "Running balance": report.running_balance}
+                for title, table in tables.items():
+                    table.delete(*table.get_children())
+                    for row in rows[title]:
+                        table.insert("", "end", values=row)
+                totals_label.config(text=f"{report.count} transactions, Total Income: ${report.total_income}, "
+                                         f"Total Expense: ${report.total_expense}, Net Balance: ${report.net_balance}")
+
+            def refresh():
+                start_date, end_date = start_entry.get().strip() or None, end_entry.get().strip() or None
+                try:
+                    for date in (start_date, end_date):
+                        if date:
+                            datetime.datetime.strptime(date, '%Y-%m-%d')
+                except ValueError:
+                    messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD.", parent=window)
+                    return
+                self.run_in_background("Summarizing...",
+                                       lambda worker: analyze_transactions(self.transactions, start_date, end_date),
+                                       show_report, cancellable=False)
+
+            ttk.Button(filter_frame, text="Apply", command=refresh).grid(row=0, column=4, padx=5, pady=5)
+            notebook.pack(fill="both", expand=True)
+            totals_label.pack(fill="x", padx=5, pady=5)
+            refresh()
+
+        # Function that returns the slot of the selected row, or None after telling the user why there is none
+        def selected_slot(self):
+            if self.loading or self.worker.busy:
+                messagebox.showinfo("Busy", "Please wait for the current operation to finish or cancel it.")
+                return None
+            slot = self.transactions.slot_of(self.selected_id) if self.selected_id is not None else None
+            if slot is None or slot not in self.rows:
+                messagebox.showinfo("No Selection", "Please select a transaction first.")
+                return None
+            return slot
+
+        # Function that remembers the transaction behind the selected item, render_rows clears the selection
+        # of items that scroll to other rows so an empty selection leaves it alone
+        def on_select(self, event=None):
+            items = self.tree.selection()
+            if items and not self.loading:
+                # Treeview items only mirror the viewport, so the row model gives the slot behind the item
+                self.selected_id = self.transactions.ids[self.rows[self.first_row + self.tree.index(items[0])]]
+
+        # Function that shows the rows of the current search again after a change, keeping the scroll position
+        def refresh_view(self):
+            first_row = self.first_row
+            query = self.search_entry.get().strip()
+            result = self.live_search.search(self.search_criteria.get(), query) if query else None
+            if result is None:
+                self.display_transactions()
+                self.update_transaction_summary(self.transactions)
+            else:
+                self.display_transactions(result[0])
+                self.update_summary_labels(*result[1])
+            self.scroll_to(first_row)
+
+        def edit_selected(self):
+            if not self.ledger_writable():
+                return
+            slot = self.selected_slot()
+            if slot is None:
+                return
+            transaction = self.transactions.transaction(slot)
+            window = tk.Toplevel(self.root)
+            window.title(f"Edit transaction {transaction['id']}")
+            ttk.Label(window, text=f"Category: {self.transactions.category(slot)}").grid(
+                row=0, column=0, columnspan=2, padx=5, pady=5)
+            entries = {}
+            for row, (field, value) in enumerate((("Amount", transaction["amount"]), ("Date", transaction["date"])),
+                                                 start=1):
+                ttk.Label(window, text=f"{field}: ").grid(row=row, column=0, padx=5, pady=5)
+                entries[field] = ttk.Entry(window)
+                entries[field].insert(0, value)
+                entries[field].grid(row=row, column=1, padx=5, pady=5)
+            ttk.Label(window, text="Type: ").grid(row=3, column=0, padx=5, pady=5)
+            type_box = ttk.Combobox(window, values=["Income", "Expense"], state="readonly")
+            type_box.set(transaction["type"].title())
+            type_box.grid(row=3, column=1, padx=5, pady=5)
+
+            def save():
+                try:
+                    amount = float(entries["Amount"].get())
+                    if not 0 < amount < float("inf"):
+                        raise ValueError
+                except ValueError:
+                    messagebox.showerror("Error", "Amount must be a positive number.", parent=window)
+                    return
+                date = entries["Date"].get().strip()
+                try:
+                    datetime.datetime.strptime(date, '%Y-%m-%d')
+                except ValueError:
+                    messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD.", parent=window)
+                    return
+                if self.worker.busy:
+                    messagebox.showerror("Error", "The ledger is busy, please try again.", parent=window)
+                    return
+                with ledger_locked(reload=False) as current:
+                    # Other processes may have moved it
+                    current_slot = self.transactions.slot_of(transaction["id"]) if current else None
+                    if current_slot is not None:
+                        self.transactions.update(current_slot, type_box.get().lower(), amount, date)
+                        record_change({"op": "update", **self.transactions.transaction(current_slot)})
+                if not current:
+                    window.destroy()
+                    self.reload_ledger(retry=True)
+                    return
+                if current_slot is None:
+                    messagebox.showerror("Error", "The transaction was deleted meanwhile.", parent=window)
+                window.destroy()
+                self.refresh_view()
+
+            ttk.Button(window, text="Save", command=save).grid(row=4, column=0, padx=5, pady=5)
+            ttk.Button(window, text="Cancel", command=window.destroy).grid(row=4, column=1, padx=5, pady=5)
+
+        def delete_selected(self):
+            if not self.ledger_writable():
+                return
+            slot = self.selected_slot()
+            if slot is None:
+                return
+            transaction_id = self.transactions.ids[slot]
+            if messagebox.askyesno("Delete", f"Delete transaction {transaction_id}?"):
+                with ledger_locked(reload=False) as current:
+                    # Other processes may have moved or deleted it
+                    slot = self.transactions.slot_of(transaction_id) if current else None
+                    if slot is not None:
+                        self.transactions.delete(slot)
+                        record_change({"op": "delete", "id": transaction_id})
+                if not current:
+                    self.reload_ledger(retry=True)
+                    return
+                self.refresh_view()
+
         def reset_search(self):
+            if self.loading:
+                return
+            if self.live_search_job is not None:
+                self.root.after_cancel(self.live_search_job)
+                self.live_search_job = None
             self.search_entry.delete(0, tk.END)
             self.search_criteria.set("Amount")
             self.display_transactions()
+            self.update_transaction_summary(self.transactions)
 
         def display_transactions(self, search_results=None):
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-
-            transactions_to_display = search_results or self.transactions
-
-            for category, transactions_list in transactions_to_display.items():
-                for transaction in transactions_list:
-                    self.tree.insert("", "end", values=(transaction["amount"], transaction["date"],
-                                                        transaction["type"], category))
+            # The row model holds store slots, the row values are looked up only for the visible rows
+            self.rows = array("q", search_results) if search_results is not None else self.transactions.slots()
+            self.first_row = 0
+            self.render_rows()
+
+        # Function that copies the rows inside the viewport into the Treeview, reusing the existing items
+        def render_rows(self):
+            if self.loading:
+                return  # The row model may hold slots of a store that is being reloaded
+            store = self.transactions
+            window = [(store.ids[slot],) + store.row(slot)
+                      for slot in self.rows[self.first_row:self.first_row + self.visible_rows]]
+            items = self.tree.get_children()
+
+            for item, row in zip(items, window):
+                self.tree.item(item, values=row)
+            for row in window[len(items):]:
+                self.tree.insert("", "end", values=row)
+            if len(items) > len(window):
+                self.tree.delete(*items[len(window):])
+
+            # The selection belongs to the transaction, so it moves to whichever item shows it now
+            items = self.tree.get_children()
+            selected = [item for item, row in zip(items, window) if row[0] == self.selected_id]
+            if tuple(selected) != self.tree.selection():
+                self.tree.selection_set(selected)
+            if selected:
+                self.tree.focus(selected[0])
+
+            if self.rows:
+                self.scrollbar.set(self.first_row / len(self.rows),
+                                   min(self.first_row + self.visible_rows, len(self.rows)) / len(self.rows))
+            else:
+                self.scrollbar.set(0, 1)
+
+        def scroll_to(self, first_row):
+            if self.loading:
+                return  # The rows may be stale until the task changing the store is done
+            first_row = max(0, min(first_row, len(self.rows) - self.visible_rows))
+            if first_row != self.first_row:
+                self.first_row = first_row
+                self.render_rows()
+
+        def scroll_rows(self, count):
+            self.scroll_to(self.first_row + count)
+            return "break"
+
+        # Function that selects the row step rows away from the selected one. The Treeview only holds the viewport,
+        # so at its edges the rows scroll instead of the arrow keys stopping there.
+        def move_selection(self, step):
+            if self.loading or not self.rows:
+                return "break"
+            window = self.rows[self.first_row:self.first_row + self.visible_rows]
+            slot = self.transactions.slot_of(self.selected_id) if self.selected_id is not None else None
+            if slot is not None and slot in window:
+                row = max(0, min(self.first_row + window.index(slot) + step, len(self.rows) - 1))
+            else:
+                row = self.first_row if step > 0 else self.first_row + len(window) - 1  # Start inside the viewport
+            self.selected_id = self.transactions.ids[self.rows[row]]
+            if self.first_row <= row < self.first_row + self.visible_rows:
+                self.render_rows()
+            else:
+                self.scroll_rows(row - self.first_row if step < 0 else row - self.first_row - self.visible_rows + 1)
+            return "break"
+
+        def on_scrollbar(self, action, amount, unit=None):
+            if action == "moveto":
+                self.scroll_to(int(float(amount) * len(self.rows)))
+            elif unit == "pages":
+                self.scroll_rows(int(amount) * self.visible_rows)
+            else:
+                self.scroll_rows(int(amount))
+
+        def on_mouse_wheel(self, event):
+            # Windows reports multiples of 120 per notch, macOS reports single steps
+            steps = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+            return self.scroll_rows(-steps * 3)
+
+        def on_tree_resize(self, event):
+            row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+            visible_rows = max(1, event.height // row_height - 1)  # One row is taken by the headings
+            if visible_rows != self.visible_rows:
+                self.visible_rows = visible_rows
+                if not self.loading:  # Otherwise the rows are shown once the task changing the store is done
+                    self.first_row = max(0, min(self.first_row, len(self.rows) - self.visible_rows))
+                    self.render_rows()
 
         def update_transaction_summary(self, transactions):
-            total_income = sum(transaction["amount"] for category, transactions_list in transactions.items() for
-                               transaction in transactions_list if transaction["type"].lower() == "income")
-            total_expense = sum(transaction["amount"] for category, transactions_list in transactions.items() for
-                                transaction in transactions_list if transaction["type"].lower() == "expense")
-            net_balance = total_income - total_expense
+            total_income, total_expense, net_balance = transactions.totals.summary()
 
             self.update_summary_labels(total_income, total_expense, net_balance)
 
         def sort_by(self, column):
-            if column in ["index"]:
+            if column in ["index"] or self.loading:
                 return
 
             current_order = self.order.get(column, "asc")
             reverse = current_order == "asc"
 
-            items = self.tree.get_children("")
-            if column == "Amount":
-                key_func = lambda x: float(self.tree.set(x, column))
-            elif column == "Date":
-                key_func = lambda x: datetime.datetime.strptime(self.tree.set(x, column), '%Y-%m-%d')
+            # Sort the row model from the store's cached permutation, the Treeview only gets the rows in the viewport
+            store = self.transactions
+            permutation = store.sort_permutation(column)
+            if len(self.rows) == len(store):
+                rows = permutation
+            elif len(self.rows) * 16 < len(store):
+                # Few rows, sorting them directly is cheaper than walking the whole permutation
+                if column == "Amount":
+                    key_func = store.amounts.__getitem__
+                elif column == "Date":
+                    key_func = store.dates.__getitem__  # Day ordinals sort chronologically
+                elif column == "Type":
+                    key_func = lambda slot: TRANSACTION_TYPES[store.types[slot]]
+                else:
+                    key_func = store.category
+                rows = array("q", sorted(self.rows, key=key_func))
             else:
-                key_func = lambda x: self.tree.set(x, column)
-
-            sorted_items = sorted(items, key=key_func, reverse=reverse)
-
-            for i, item in enumerate(sorted_items):
-                self.tree.move(item, "", i)
+                shown = bytearray(len(store.alive))
+                for slot in self.rows:
+                    shown[slot] = 1
+                rows = array("q", [slot for slot in permutation if shown[slot]])
+            self.rows = rows[::-1] if reverse else rows
+            self.first_row = 0
+            self.render_rows()
 
             # Reverse order for next click
             self.order[column] = "desc" if current_order == "asc" else "asc"
 
     def main():
-        load_transactions("transactions.json")
         root = tk.Tk()
         app = FinanceTrackerGUI(root, transactions)
+        app.load_ledger()  # Loads on the worker so the window shows up right away
+        app.watch_ledger()  # Picks up what other processes add to the ledger while the window is open
+
+        def close():
+            if instrumentation is not None:
+                instrumentation.report()
+            root.destroy()
+
+        root.protocol("WM_DELETE_WINDOW", close)
         root.mainloop()
 
     if __name__ == "__main__":
         main()
 
 
-def load_transactions(filename):
-    global transactions  # Declare transactions as global
+# Class that decodes a category -> list of transactions JSON file one category at a time, reading it in chunks
+class StreamingLedgerReader:
+    WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+    def __init__(self, file, chunk_size=1 << 20):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.empty = False  # True when the file holds nothing but whitespace
+
+    # Function that appends the next chunk, at least doubling the unread part so retries stay linear
+    def read_more(self):
+        chunk = self.file.read(max(self.chunk_size, len(self.buffer) - self.position))
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return chunk != ""
+
+    # Function that skips whitespace and returns the next character, or "" at the end of the file
+    def peek(self):
+        while True:
+            self.position = self.WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return ""
+
+    def expect(self, characters):
+        character = self.peek()
+        if character == "" or character not in characters:
+            raise json.JSONDecodeError(f"Expecting one of {characters!r}", self.buffer, self.position)
+        self.position += 1
+        return character
+
+    # Function that decodes the JSON value at the current position, reading more when it is incomplete
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, self.position = self.decoder.raw_decode(self.buffer, self.position)
+                return value
+            except json.JSONDecodeError:
+                if not self.read_more():
+                    raise
+
+    def __iter__(self):
+        if self.peek() == "":
+            self.empty = True
+            return
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            category = self.decode()
+            self.expect(":")
+            yield category, self.decode()
+            if self.expect(",}") == "}":
+                return
+
+
+BINARY_EXTENSION = ".ftb"  # Ledger files with this extension use the binary snapshot format
+BINARY_MAGIC = b"FTB1"
+BINARY_VERSION = 1
+# Magic, version, rows, categories and the offsets of the category table, string table, amounts, dates, types and ids
+BINARY_HEADER = struct.Struct("<4sIqqqqqqqq")
+BINARY_CATEGORY = struct.Struct("<qqqq")  # First row, row count, name offset and name length of a category
+
+
+def is_binary_ledger(filename):
+    return filename.endswith(BINARY_EXTENSION)
+
+
+# Function that writes a store as a binary snapshot: a header, a category table with its string table and then
+# the amount, date and type columns as fixed-width little-endian blocks, with the rows grouped by category.
+# selected is a list of (category, slots) to write only some rows, by default every row is written.
+def write_binary_snapshot(transactions, file, selected=None):
+    if selected is None:
+        selected = transactions.live_categories()
+    categories = [(name.encode("utf-8"), slots) for name, slots in selected if slots]
+    row_count = sum(len(slots) for _, slots in categories)
+    table_offset = BINARY_HEADER.size
+    strings_offset = table_offset + BINARY_CATEGORY.size * len(categories)
+    amounts_offset = (strings_offset + sum(len(name) for name, _ in categories) + 7) // 8 * 8
+    ids_offset = amounts_offset + 8 * row_count
+    dates_offset = ids_offset + 8 * row_count
+    types_offset = dates_offset + 4 * row_count
+    file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, row_count, len(categories), table_offset,
+                                  strings_offset, amounts_offset, dates_offset, types_offset, ids_offset))
+    first_row = name_offset = 0
+    for name, slots in categories:
+        file.write(BINARY_CATEGORY.pack(first_row, len(slots), name_offset, len(name)))
+        first_row += len(slots)
+        name_offset += len(name)
+    file.write(b"".join(name for name, _ in categories))
+    file.write(bytes(amounts_offset - strings_offset - name_offset))  # Align the amounts to 8 bytes
+    for column in (transactions.amounts, transactions.ids, transactions.dates, transactions.types):
+        for _, slots in categories:
+            values = array(column.typecode, [column[slot] for slot in slots])
+            if sys.byteorder == "big":
+                values.byteswap()
+            file.write(values.tobytes())
+
+
+# Class that memory-maps a binary snapshot and exposes its columns as zero-copy memoryviews
+class BinarySnapshot:
+    def __init__(self, filename):
+        self.file = open(filename, "rb")
+        self.views = []
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"{filename} is empty") from None
+        magic, version = struct.unpack_from("<4sI", self.map) if len(self.map) >= 8 else (b"", 0)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            self.close()
+            raise ValueError(f"{filename} is not a binary ledger snapshot")
+        try:
+            self.read_sections()
+        except (ValueError, struct.error) as e:
+            self.close()
+            raise ValueError(f"{filename} is truncated or corrupt: {e}") from None
+
+    # Function that reads the header and the category table, checking every section against the file size
+    def read_sections(self):
+        self.check(0, BINARY_HEADER.size, "header")
+        (magic, version, self.row_count, category_count, table_offset, strings_offset, amounts_offset,
+         dates_offset, types_offset, ids_offset) = BINARY_HEADER.unpack_from(self.map)
+        self.check(ids_offset, 8 * self.row_count, "ids")
+        self.ids = self.view(ids_offset, 8 * self.row_count, "q")
+        self.check(amounts_offset, 8 * self.row_count, "amounts")
+        self.check(dates_offset, 4 * self.row_count, "dates")
+        self.check(types_offset, self.row_count, "types")
+        self.check(table_offset, BINARY_CATEGORY.size * category_count, "category table")
+        self.amounts = self.view(amounts_offset, 8 * self.row_count, "d")
+        self.dates = self.view(dates_offset, 4 * self.row_count, "i")
+        self.types = self.view(types_offset, self.row_count, "b")
+        if self.map[types_offset:types_offset + self.row_count].translate(None, b"\x00\x01"):
+            raise ValueError("types column holds unknown transaction types")
+        self.categories = []  # (name, first row, row count)
+        next_row = 0
+        for index in range(category_count):
+            first_row, row_count, name_offset, name_length = BINARY_CATEGORY.unpack_from(
+                self.map, table_offset + index * BINARY_CATEGORY.size)
+            if first_row != next_row or row_count < 0 or first_row + row_count > self.row_count:
+                raise ValueError(f"rows of category {index} are out of order or out of range")
+            next_row += row_count
+            self.check(strings_offset + name_offset, name_length, f"name of category {index}")
+            name = self.map[strings_offset + name_offset:strings_offset + name_offset + name_length].decode("utf-8")
+            self.categories.append((name, first_row, row_count))
+        if next_row != self.row_count:
+            raise ValueError(f"categories hold {next_row} of {self.row_count} rows")
+
+    # Function that raises ValueError unless length bytes from offset on lie within the file
+    def check(self, offset, length, section):
+        if offset < 0 or length < 0 or offset + length > len(self.map):
+            raise ValueError(f"{section} ({length} bytes at {offset}) beyond the end of the file "
+                             f"({len(self.map)} bytes)")
+
+    def view(self, offset, length, format):
+        view = memoryview(self.map)[offset:offset + length]
+        self.views.append(view)
+        self.views.append(view.cast(format))
+        return self.views[-1]
+
+    # Function that returns zero-copy (amounts, dates, types) views of one category
+    def category(self, name):
+        for category, first_row, row_count in self.categories:
+            if category == name:
+                last_row = first_row + row_count
+                return self.amounts[first_row:last_row], self.dates[first_row:last_row], self.types[first_row:last_row]
+        raise KeyError(name)
+
+    def close(self):
+        for view in reversed(self.views):
+            view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Invalid transactions are skipped and reported. A file that cannot be read at all leaves the store empty with
+# load_error set, which keeps it from being saved over the file.
+def load_transactions(filename, transactions=transactions):
+    transactions.clear()  # Reuse the store so every reference to it sees the loaded data
     try:
+        if is_binary_ledger(filename):
+            if os.path.getsize(filename) == 0:
+                print(f"File {filename} is empty.")  # Same as an empty JSON file, nothing to protect
+                return transactions
+            with BinarySnapshot(filename) as snapshot:
+                transactions.load_binary(snapshot)
+            return transactions
+        bad_rows = []
         with open(filename, "r") as file:
-            data = file.read()  # Read file contents
-            if data.strip() == "":
+            reader = StreamingLedgerReader(file)
+            for category, transactions_list in reader:  # Decode and store one category at a time
+                bad_rows.extend(transactions.load_dict({category: transactions_list}))
+            transactions.fill_missing_ids()
+            if reader.empty:
                 print(f"File {filename} is empty.")
-                return {}
-            transactions = json.loads(data)  # Load transactions from the JSON data
+        if bad_rows:
+            category, position, reason = bad_rows[0]
+            print(f"Skipped {len(bad_rows)} invalid transactions in file {filename}, the first one is number "
+                  f"{position + 1} of category {category!r} ({reason}). They are saved back unchanged.")
     except FileNotFoundError:
-        transactions = {}   # If the file is not found, set transactions as an empty dictionary
-    except json.JSONDecodeError:
-        print(f"Error decoding JSON data in file {filename}.")
-        transactions = {}  # Set transactions as an empty dictionary
+        pass  # If the file is not found, keep the store empty
+    except json.JSONDecodeError as e:
+        transactions.clear()
+        transactions.load_error = f"Error decoding JSON data in file {filename}: {e}"
+        print(transactions.load_error)
+    except (KeyError, ValueError, TypeError, AttributeError) as e:
+        transactions.clear()
+        transactions.load_error = f"Invalid transaction data in file {filename}: {e}"
+        print(transactions.load_error)
     return transactions
 
+# Class that describes the outcome of a bulk import
+class ImportResult:
+    def __init__(self, filename):
+        self.filename = filename
+        self.imported = 0  # Rows added to the store
+        self.bad_row_count = 0  # Rows that were skipped
+        self.bad_rows = []  # (line number, reason) for the first skipped rows
+        self.elapsed = 0.0  # Seconds spent importing
+
+    @property
+    def rows_per_second(self):
+        return (self.imported + self.bad_row_count) / self.elapsed if self.elapsed else 0.0
+
+    def skip(self, line_number, reason, max_reported=100):
+        self.bad_row_count += 1
+        if len(self.bad_rows) < max_reported:
+            self.bad_rows.append((line_number, reason))
+
+
+# Function that validates a type,category,amount,date row and returns (type code, category, amount, date ordinal)
+def parse_transaction_row(parts):
+    if len(parts) != 4:
+        raise ValueError(f"expected 4 fields, found {len(parts)}")
+    transaction_type, category, amount_str, date = parts
+    try:
+        type_code = TRANSACTION_TYPES.index(transaction_type.strip().lower())
+    except ValueError:
+        raise ValueError(f"invalid type {transaction_type!r}") from None
+    category = category.strip()
+    if not category:
+        raise ValueError("empty category")
+    if not category.isascii():
+        try:
+            category.encode("utf-8")
+        except UnicodeEncodeError:
+            raise ValueError(f"category is not valid UTF-8: {category!r}") from None
+    try:
+        amount = float(amount_str)
+    except ValueError:
+        raise ValueError(f"invalid amount {amount_str!r}") from None
+    if not 0 < amount < float("inf"):
+        raise ValueError(f"amount must be positive, found {amount_str!r}")
+    try:
+        ordinal = date_to_ordinal(date.strip())
+    except ValueError:
+        raise ValueError(f"invalid date {date!r}") from None
+    return type_code, category, amount, ordinal
 
-def read_bulk_transactions_from_file(filename):
-    transactions = {}
+
+# Function that yields the rows of a csv reader, a row the csv module cannot parse is passed to skip and left out
+def csv_rows(reader, skip):
+    while True:
+        try:
+            for parts in reader:
+                yield parts
+            return
+        except csv.Error as e:
+            skip(reader.line_num, f"invalid CSV: {e}")
+
+
+# Function that streams a type,category,amount,date file into the store in batches, appending to existing
+# categories. Bad rows are skipped and reported, progress(result, fraction) is called after every batch.
+def read_bulk_transactions_from_file(filename, transactions=transactions, batch_size=50000, progress=None,
+                                     buffer_size=1 << 20):
+    result = ImportResult(filename)
+    start = time.perf_counter()
     try:
-        with open(filename, "r") as file:
-            for line in file:
-                parts = line.strip().split(",")
-                if len(parts) == 4:
-                    transaction_type, category, amount_str, date = parts
-                    amount = float(amount_str)
-                    if category in transactions:
-                        transactions[category].append(
-                            {"amount": amount, "type": transaction_type.lower(), "date": date})
-                    else:
-                        transactions[category] = [{"amount": amount, "type": transaction_type.lower(), "date": date}]
-            print("Transactions read from file successfully.")
-            return transactions
+        total_bytes = os.path.getsize(filename)
+        # Bytes that are not UTF-8 are kept as surrogates, parse_transaction_row rejects the rows holding them
+        with open(filename, "r", encoding="utf-8", errors="surrogateescape", newline="",
+                  buffering=buffer_size) as file:
+            reader = csv.reader(file)
+            rows = csv_rows(reader, result.skip)
+            rows_read = batch_size
+            while rows_read == batch_size:
+                batch = []
+                rows_read = 0
+                for parts in itertools.islice(rows, batch_size):
+                    rows_read += 1
+                    if not parts:
+                        continue  # Skip blank lines
+                    try:
+                        batch.append(parse_transaction_row(parts))
+                    except ValueError as e:
+                        result.skip(reader.line_num, str(e))
+                if batch:
+                    transactions.extend(batch)
+                    result.imported += len(batch)
+                result.elapsed = time.perf_counter() - start
+                if progress is not None:
+                    progress(result, file.buffer.tell() / total_bytes if total_bytes else 1.0)
     except FileNotFoundError:
         print(f"File {filename} not found.")
-    except ValueError:
-        print("Error parsing transaction data. Please check the data format in the file.")
+        return None
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+# Function that parses one bulk file in a worker process and returns its rows as per-category column bytes
+def parse_transaction_file(filename):
+    store = TransactionStore()
+    result = read_bulk_transactions_from_file(filename, store)
+    partial = []
+    for category, slots in zip(store.category_names, store.category_slots):
+        partial.append((category, array("b", [store.types[slot] for slot in slots]).tobytes(),
+                        array("d", [store.amounts[slot] for slot in slots]).tobytes(),
+                        array("i", [store.dates[slot] for slot in slots]).tobytes()))
+    return partial, result
+
+
+# Function that returns the bulk files matched by a directory (its .csv and .txt files) or a glob pattern
+def find_bulk_files(pattern):
+    if os.path.isdir(pattern):
+        return sorted(glob.glob(os.path.join(pattern, "*.csv")) + glob.glob(os.path.join(pattern, "*.txt")))
+    return sorted(glob.glob(pattern))
+
+
+# Function that imports several bulk files in parallel. Every file is parsed in a worker process and the
+# partial results are merged in file name order, so the store ends up the same whatever the worker count.
+def import_transactions_from_files(pattern, transactions=transactions, workers=None, progress=None):
+    filenames = find_bulk_files(pattern)
+    results = []
+    if not filenames:
+        print(f"No files match {pattern}.")
+        return results
+    from concurrent.futures import ProcessPoolExecutor  # Only parallel imports need the process pool
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial, result in executor.map(parse_transaction_file, filenames):
+            for category, types, amounts, dates in partial:
+                transactions.extend_category(category, array("b", types), array("d", amounts), array("i", dates))
+            if result is not None:
+                results.append(result)
+            if progress is not None:
+                progress(len(results), len(filenames))
+    return results
+
+
+# Function that shows the progress of a bulk import on one console line
+def print_import_progress(result, fraction):
+    print(f"\rImporting... {fraction:.0%} ({result.imported} rows)", end="", flush=True)
+
+
+# Function that prints how a bulk import went
+def print_import_result(result):
+    print(f"Imported {result.imported} transactions from {result.filename} "
+          f"({result.rows_per_second:,.0f} rows per second).")
+    if result.bad_row_count:
+        print(f"Skipped {result.bad_row_count} invalid rows:")
+        for line_number, reason in result.bad_rows:
+            print(f"  Line {line_number}: {reason}")
+        if result.bad_row_count > len(result.bad_rows):
+            print(f"  ... and {result.bad_row_count - len(result.bad_rows)} more")
+
+
+EXPORT_FORMATS = {"csv": ".csv", "ndjson": ".ndjson", "binary": ".ftb"}  # Export format -> file extension
+
+
+# Class that reports how an export went
+class ExportResult:
+    def __init__(self, filename):
+        self.filename = filename
+        self.exported = 0  # Rows written
+        self.file_size = 0  # Bytes in the written file, after compression
+        self.elapsed = 0.0  # Seconds spent exporting
+
+    @property
+    def rows_per_second(self):
+        return self.exported / self.elapsed if self.elapsed else 0.0
+
+
+# Function that returns (category, slots) for every category with rows matching the export filters
+def select_export_rows(store, start_date=None, end_date=None, categories=None, transaction_type=None):
+    start = date_to_ordinal(start_date) if start_date else None
+    end = date_to_ordinal(end_date) if end_date else None
+    type_code = TRANSACTION_TYPES.index(transaction_type.lower()) if transaction_type else None
+    wanted = set(categories) if categories is not None else None
+    dates, types = store.dates, store.types
+    selected = []
+    for category, slots in store.live_categories():
+        if wanted is not None and category not in wanted:
+            continue
+        if start is not None or end is not None or type_code is not None:
+            slots = array("q", [slot for slot in slots if (start is None or dates[slot] >= start)
+                                and (end is None or dates[slot] <= end)
+                                and (type_code is None or types[slot] == type_code)])
+        if slots:
+            selected.append((category, slots))
+    return selected
+
+
+# Function that formats rows as type,category,amount,date CSV lines, the shape read by the bulk importer
+def format_csv_rows(store, category, slots):
+    amounts, dates, types = store.amounts, store.dates, store.types
+    buffer = io.StringIO()
+    # Quoted once for the whole batch when needed, the line terminator makes the writer quote line breaks too
+    csv.writer(buffer, lineterminator="\r\n").writerow([category])
+    category = buffer.getvalue()[:-2]
+    return "".join(f"{TRANSACTION_TYPES[types[slot]]},{category},{amounts[slot]!r},{ordinal_to_date(dates[slot])}\n"
+                   for slot in slots)
+
+
+# Function that formats rows as one JSON object per line
+def format_ndjson_rows(store, category, slots):
+    amounts, dates, types, ids = store.amounts, store.dates, store.types, store.ids
+    category = json.dumps(category)  # Quoted once for the whole batch
+    return "".join(f'{{"id": {ids[slot]}, "type": "{TRANSACTION_TYPES[types[slot]]}", "category": {category}, '
+                   f'"amount": {amounts[slot]!r}, "date": "{ordinal_to_date(dates[slot])}"}}\n' for slot in slots)
+
+
+# Function that streams the selected transactions to a csv, ndjson or binary file, optionally gzip compressed.
+# Rows are formatted batch_size at a time and written in large blocks, progress(result, fraction) follows every batch.
+def export_transactions(filename, transactions=transactions, export_format="csv", start_date=None, end_date=None,
+                        categories=None, transaction_type=None, compress=False, batch_size=50000, progress=None,
+                        buffer_size=1 << 20):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    result = ExportResult(filename)
+    start = time.perf_counter()
+    selected = select_export_rows(transactions, start_date, end_date, categories, transaction_type)
+    total_rows = sum(len(slots) for _, slots in selected)
+    with open(filename, "wb", buffering=buffer_size) as file:
+        with gzip.GzipFile(fileobj=file, mode="wb", compresslevel=6) if compress else contextlib.nullcontext(file) \
+                as output:
+            if export_format == "binary":
+                write_binary_snapshot(transactions, output, selected)
+                result.exported = total_rows
+            else:
+                format_rows = format_csv_rows if export_format == "csv" else format_ndjson_rows
+                for category, slots in selected:
+                    for batch_start in range(0, len(slots), batch_size):
+                        batch = slots[batch_start:batch_start + batch_size]
+                        output.write(format_rows(transactions, category, batch).encode("utf-8"))
+                        result.exported += len(batch)
+                        result.elapsed = time.perf_counter() - start
+                        if progress is not None:
+                            progress(result, result.exported / total_rows)
+    result.file_size = os.path.getsize(filename)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+# Function that prints the progress of an export on one line
+def print_export_progress(result, fraction):
+    print(f"\rExporting... {fraction:.0%} ({result.exported} rows)", end="", flush=True)
 
 
+# Function that prints how an export went
+def print_export_result(result):
+    print(f"Exported {result.exported} transactions to {result.filename} ({result.file_size / 2 ** 20:.1f} MiB, "
+          f"{result.rows_per_second:,.0f} rows per second).")
+
 
 # Welcome message function
 
 
 # Function to load transactions from file
 
-def save_transactions(transactions):
+# Function that saves the ledger, merge is a store of imported rows to add to it first
+def save_transactions(transactions, background=False, merge=None):
     try:
-        with open("transactions.json", "w") as file:
-            json.dump(transactions, file, indent=1)  # Write transactions to JSON file
+        if journal is not None and journal.store is transactions:
+            return journal.compact(background, merge)  # Fold the journal into a new snapshot
+        if transactions.load_error is not None:
+            print(f"Not saving the ledger because it could not be loaded. {transactions.load_error}")
+            return False
+        if merge is not None:
+            transactions.merge(merge)
+        write_snapshot(transactions, TRANSACTIONS_FILE)
+        return True
     except Exception as e:
         print(f"Error saving transactions: {e}")  # Print error message if saving fails
+        return False
+
+
+# Function that writes a snapshot next to filename and then atomically replaces filename with it.
+# The format follows the extension of filename unless binary is given.
+def write_snapshot(transactions, filename, replace=True, binary=None):
+    if binary is None:
+        binary = is_binary_ledger(filename)
+    temporary_filename = filename + ".tmp" if replace else filename
+    with open(temporary_filename, "wb" if binary else "w") as file:
+        if binary:
+            write_binary_snapshot(transactions, file)
+        else:
+            json.dump(transactions.group_by_category(), file, indent=1)  # Write transactions to JSON file
+        file.flush()
+        os.fsync(file.fileno())
+    if replace:
+        os.replace(temporary_filename, filename)
+
+
+# Function that applies one journal record to a store
+def apply_journal_record(store, record):
+    operation = record["op"]
+    if operation == "generation":
+        return  # Header of a journal started by a compaction, not a change
+    if operation == "add":
+        store.add(record["type"], record["category"], record["amount"], record["date"], record.get("id"))
+        return
+    slot = store.slot_of(record["id"])
+    if slot is None:
+        raise KeyError(f"No transaction with id {record['id']}")
+    if operation == "update":
+        store.update(slot, record["type"], record["amount"], record["date"])
+    elif operation == "delete":
+        store.delete(slot)
+    else:
+        raise ValueError(f"Unknown journal operation {operation!r}")
+
+
+LARGE_JOURNAL_BYTES = 1 << 20  # Journal records replayed at once beyond which the indexes are rebuilt instead
+
+
+# Class that holds an exclusive lock on a lock file, which every process using the ledger takes before it touches
+# the journal or the snapshot. The operating system drops the lock when its process dies.
+class LedgerLock:
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+
+    def acquire(self, blocking=True):
+        if self.file is None:
+            self.file = open(self.filename, "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+        while True:
+            try:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)  # Lock the first byte of the file
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.05)
+
+    def release(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# Function that reads the header line of a journal file, journals written before generations have none
+def read_journal_header(filename):
+    try:
+        with open(filename, "rb") as file:
+            line = file.readline()
+    except FileNotFoundError:
+        return {}
+    if not line.startswith(b'{"op":"generation"') or not line.endswith(b"\n"):
+        return {}
+    return json.loads(line)
+
+
+# Class that appends every change to a journal file instead of rewriting the whole snapshot.
+# transactions.json stays the snapshot, changes go to transactions.json.journal one compact JSON line each.
+# Compaction moves the journal aside to .compacting, writes the new snapshot to .compact, moves .compacting on to
+# .journal.previous and finally replaces the snapshot, so recovery can always tell which files are complete.
+# Several processes can share the ledger: every write happens under transactions.json.lock after the records the
+# other processes appended have been applied, and each new journal starts with a generation header, so a process
+# that only tracks its offset in the journal notices when another one compacted.
+class TransactionJournal:
+    def __init__(self, store, filename=TRANSACTIONS_FILE, fsync_every=64, fsync_interval=1.0, compact_every=10000):
+        self.store = store
+        self.filename = filename
+        self.journal_filename = filename + ".journal"
+        self.compacting_filename = filename + ".compacting"
+        self.compact_filename = filename + ".compact"
+        self.previous_filename = self.journal_filename + ".previous"  # Journal folded in by the last compaction
+        self.fsync_every = fsync_every  # Records written before the journal is fsynced
+        self.fsync_interval = fsync_interval  # Seconds after which a pending record is fsynced anyway
+        self.compact_every = compact_every  # Records in the journal that trigger a background compaction
+        self.file = None
+        self.unsynced_records = 0
+        self.last_fsync = time.monotonic()
+        self.sync_timer = None  # Fsyncs the last records of a burst that no later append flushes
+        self.journal_records = 0
+        self.lock = threading.RLock()
+        self.ledger_lock = LedgerLock(filename + ".lock")  # Held while this process writes the ledger
+        self.compaction_lock = LedgerLock(filename + ".compaction.lock")  # Held while a compaction is in progress
+        self.lock_depth = 0
+        self.generation = 0  # Generation of the journal file that self.file appends to
+        self.journal_offset = 0  # Bytes of the journal already applied to the store
+        self.compaction_thread = None
+        self.loaded = False  # True once the snapshot and journal have been loaded into the store
+
+    # Function that returns a context manager holding the ledger lock. With catch_up the records other processes
+    # appended are applied first, so a change made inside sees the current ledger and gets unused ids. With compact
+    # a journal that has grown too long is compacted once the outermost change is done.
+    # It yields True, or False when the lock was busy without blocking, or when catching up needs a reload that
+    # reload=False does not allow. Nothing may be changed then, the store does not match the ledger.
+    @contextlib.contextmanager
+    def locked(self, catch_up=True, compact=True, reload=True, blocking=True):
+        if not self.lock.acquire(blocking=blocking):
+            yield False
+            return
+        try:
+            if self.lock_depth == 0 and not self.ledger_lock.acquire(blocking=blocking):
+                yield False
+                return
+            self.lock_depth += 1
+            try:
+                current = True
+                if catch_up and self.lock_depth == 1 and self.file is not None:
+                    current = self.catch_up_locked(reload) is not None
+                yield current
+            finally:
+                self.lock_depth -= 1
+                if self.lock_depth == 0:
+                    self.ledger_lock.release()
+        finally:
+            self.lock.release()
+        if (compact and catch_up and self.lock_depth == 0 and self.loaded and
+                self.journal_records >= self.compact_every):
+            self.compact(background=True, wait=False)  # Only a loaded store can be written as the new snapshot
+
+    # Function that loads the snapshot, finishes an interrupted compaction and replays the journal. A journal that
+    # does not fit the snapshot sets load_error, so the ledger is shown as far as it could be read but never saved.
+    # The snapshot is parsed before the ledger lock is taken, so other processes are only held up by the replay.
+    def recover(self):
+        generation = self.load_snapshot_unlocked()
+        with self.locked(catch_up=False):
+            if self.file is not None:
+                self.file.close()
+            self.generation = read_journal_header(self.journal_filename).get("generation", 0)
+            try:
+                if generation != self.generation or os.path.exists(self.compacting_filename):
+                    self.load_locked()  # A compaction ran meanwhile, the snapshot may not fit the journal
+                elif self.store.load_error is None:
+                    self.journal_records, self.journal_offset = self.replay(self.journal_filename, truncate=True)
+            except ValueError as e:
+                self.store.load_error = str(e)
+                print(f"The journal of {self.filename} could not be replayed. {e}")
+            if self.store.load_error is not None:
+                # The journal only makes sense on top of its snapshot, leave both untouched
+                self.journal_records = 0
+                self.journal_offset = os.path.getsize(self.journal_filename) \
+                    if os.path.exists(self.journal_filename) else 0
+            self.file = open(self.journal_filename, "a", encoding="utf-8", newline="\n")
+            self.loaded = True
+        return self.store
+
+    # Function that loads the snapshot without the ledger lock. It returns the generation of the journal that continues
+    # it, or None when a compaction is pending and the ledger has to be loaded with the lock held. A compaction
+    # replaces the snapshot together with its journal, so recover can tell by the generation whether one ran meanwhile.
+    def load_snapshot_unlocked(self):
+        generation = read_journal_header(self.journal_filename).get("generation", 0)
+        if os.path.exists(self.compacting_filename) or os.path.exists(self.compact_filename):
+            return None
+        load_transactions(self.filename, self.store)
+        return generation
+
+    # Function that loads the snapshot and the journals into the store, with the ledger lock held
+    def load_locked(self):
+        if os.path.exists(self.compacting_filename):
+            if self.compaction_lock.acquire(blocking=False):
+                try:
+                    # Crashed before the new snapshot was complete, redo the compaction from the old snapshot
+                    load_transactions(self.filename, self.store)
+                    if self.store.load_error is not None:
+                        return
+                    self.replay(self.compacting_filename)
+                    write_snapshot(self.store, self.compact_filename, replace=False,
+                                   binary=is_binary_ledger(self.filename))
+                    os.replace(self.compacting_filename, self.previous_filename)
+                    os.replace(self.compact_filename, self.filename)
+                finally:
+                    self.compaction_lock.release()
+            else:
+                # Another process is compacting, until it is done the old journal completes the old snapshot
+                load_transactions(self.filename, self.store)
+                if self.store.load_error is not None:
+                    return
+                self.replay(self.compacting_filename)
+        else:
+            if os.path.exists(self.compact_filename):
+                # Crashed after the new snapshot was complete but before it replaced the old one
+                os.replace(self.compact_filename, self.filename)
+            load_transactions(self.filename, self.store)
+            if self.store.load_error is not None:
+                return
+        self.journal_records, self.journal_offset = self.replay(self.journal_filename, truncate=True)
+
+    # Function that opens the journal for appending without loading the ledger, for changes that need no data
+    def open_for_append(self):
+        with self.locked(catch_up=False):
+            self.repair_tail()
+            self.generation = read_journal_header(self.journal_filename).get("generation", 0)
+            self.file = open(self.journal_filename, "a", encoding="utf-8", newline="\n")
+
+    # Function that cuts a partially written last record so new records start on their own line
+    def repair_tail(self):
+        try:
+            with open(self.journal_filename, "r+b") as file:
+                end = position = file.seek(0, os.SEEK_END)
+                while position > 0:
+                    step = min(65536, position)
+                    position -= step
+                    file.seek(position)
+                    block = file.read(step)
+                    if position + step == end and block.endswith(b"\n"):
+                        return
+                    newline = block.rfind(b"\n")
+                    if newline >= 0:
+                        print(f"Discarding the incomplete end of {self.journal_filename}.")
+                        file.truncate(position + newline + 1)
+                        return
+                file.truncate(0)
+        except FileNotFoundError:
+            pass
+
+    # Function that applies the records of a journal file from offset on. A last record that was only partly written,
+    # because its process died while appending it, ends the replay and is cut off when truncate is True. A complete
+    # record that cannot be applied raises ValueError and leaves the file alone.
+    # It returns the number of records applied and the offset after the last of them.
+    def replay(self, journal_filename, truncate=False, offset=0):
+        records = 0
+        good_offset = offset
+        torn = False
+        try:
+            with open(journal_filename, "rb") as file:
+                if os.fstat(file.fileno()).st_size - offset > LARGE_JOURNAL_BYTES:
+                    self.store.drop_indexes()  # Rebuilt afterwards, cheaper than inserting a whole batch
+                file.seek(offset)
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                        complete = line.endswith(b"\n")
+                    except ValueError:
+                        complete = False
+                    if not complete:
+                        if file.read(1):
+                            raise ValueError(f"Invalid record at byte {good_offset} of {journal_filename}")
+                        torn = True  # Only the last record can be a torn write
+                        break
+                    try:
+                        apply_journal_record(self.store, record)
+                    except (KeyError, ValueError, IndexError, TypeError) as e:
+                        raise ValueError(f"Cannot apply the record at byte {good_offset} of {journal_filename}: "
+                                         f"{type(e).__name__}: {e}") from e
+                    good_offset += len(line)
+                    records += record["op"] != "generation"  # The header of a journal is not a change
+        except FileNotFoundError:
+            return 0, offset
+        if torn and truncate:
+            print(f"Discarding the incomplete end of {journal_filename}.")
+            with open(journal_filename, "r+b") as file:
+                file.truncate(good_offset)
+        return records, good_offset
+
+    # Function that applies the records other processes appended since this one last read the journal, with the
+    # ledger lock held. When another process compacted meanwhile the rest of the old journal is read from
+    # .compacting or .journal.previous, and if that is gone too the ledger is reloaded, or None is returned when
+    # reload is False. It returns the number of records applied.
+    def catch_up_locked(self, reload=True):
+        header = read_journal_header(self.journal_filename)
+        records = 0
+        if header.get("generation", 0) != self.generation:
+            if self.loaded:
+                old_journals = [filename for filename in (self.compacting_filename, self.previous_filename)
+                                if os.path.exists(filename) and
+                                read_journal_header(filename).get("generation", 0) == self.generation]
+                if header.get("generation") == self.generation + 1 and old_journals:
+                    records = self.replay(old_journals[0], offset=self.journal_offset)[0]
+                elif reload:
+                    self.recover()
+                    return len(self.store)
+                else:
+                    return None
+            self.file.close()
+            self.file = open(self.journal_filename, "a", encoding="utf-8", newline="\n")
+            self.generation = header.get("generation", 0)
+            self.journal_offset = 0
+        if not self.loaded:
+            self.repair_tail()  # A process that died while appending may have left half a record
+            return 0
+        applied, self.journal_offset = self.replay(self.journal_filename, truncate=True, offset=self.journal_offset)
+        self.journal_records += applied
+        return records + applied
+
+    # Function that applies the changes other processes made since the last call, for a process that keeps the
+    # ledger open. The journal is only locked and read when it has grown or has been replaced by a compaction.
+    # It returns the number of records applied, or None when the ledger has to be reloaded with recover.
+    def refresh(self):
+        try:
+            if (os.path.getsize(self.journal_filename) == self.journal_offset and
+                    read_journal_header(self.journal_filename).get("generation", 0) == self.generation):
+                return 0
+        except FileNotFoundError:
+            pass
+        with self.locked(catch_up=False, blocking=False) as acquired:
+            if not acquired:
+                return 0  # Another process holds the ledger, the changes are applied on a later call
+            return self.catch_up_locked(reload=False)
+
+    # Function that tells whether refresh has more than LARGE_JOURNAL_BYTES of records to apply, or has to follow
+    # a compaction, so a GUI can run it on a worker thread
+    def refresh_is_large(self):
+        try:
+            return (os.path.getsize(self.journal_filename) - self.journal_offset > LARGE_JOURNAL_BYTES or
+                    read_journal_header(self.journal_filename).get("generation", 0) != self.generation)
+        except FileNotFoundError:
+            return False
+
+    # Function that raises ValueError when the ledger could not be loaded, so nothing is written on top of it
+    def check_writable(self):
+        if self.store.load_error is not None:
+            raise ValueError(f"The ledger cannot be changed because it could not be loaded. {self.store.load_error}")
+
+    def append(self, record):
+        self.check_writable()
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.locked():
+            self.file.write(line)
+            self.file.flush()
+            self.unsynced_records += 1
+            if (self.unsynced_records >= self.fsync_every or
+                    time.monotonic() - self.last_fsync >= self.fsync_interval):
+                self.sync_locked()
+            elif self.sync_timer is None:
+                self.sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self.sync_timer.daemon = True
+                self.sync_timer.start()
+            self.journal_records += 1
+            self.journal_offset += len(line)  # Compact JSON is plain ASCII, one byte per character
+
+    # Function that appends many records with one write and one fsync, for batch changes
+    def append_many(self, records):
+        self.check_writable()
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        with self.locked():
+            self.file.write(lines)
+            self.file.flush()
+            self.unsynced_records += len(records)
+            self.sync_locked()
+            self.journal_records += len(records)
+            self.journal_offset += len(lines)
+
+    def sync_locked(self):
+        if self.unsynced_records:
+            os.fsync(self.file.fileno())
+            self.unsynced_records = 0
+        self.last_fsync = time.monotonic()
+
+    def sync(self):
+        with self.lock:
+            self.sync_timer = None
+            if self.file is not None:
+                self.sync_locked()
+
+    # Function that folds the journal into a new snapshot, the file is written on a thread when background is True.
+    # merge is a store of imported rows that is merged in once the changes of other processes have been applied, so
+    # they get ids no other process has used, and journaled so those processes can replay them. Without wait the
+    # compaction is skipped while another process compacts.
+    # It returns False when the snapshot could not be written or the compaction was skipped without keeping merge.
+    def compact(self, background=False, merge=None, wait=True):
+        if self.store.load_error is not None:
+            print(f"Not saving the ledger because it could not be loaded. {self.store.load_error}")
+            return False
+        self.wait_for_compaction()  # Only one compaction at a time
+        if not self.compaction_lock.acquire(blocking=wait):  # Always taken before the ledger lock
+            return False
+        try:
+            with self.locked(compact=False):
+                if merge is not None:
+                    self.merge_locked(merge)  # Kept in the journal even when the compaction cannot go on
+                if os.path.exists(self.compacting_filename):
+                    # A failed compaction left its journal behind, recovery folds it in so keep appending
+                    print(f"Skipping compaction, {self.compacting_filename} is still pending.")
+                    self.compaction_lock.release()
+                    return merge is not None
+                self.sync_locked()
+                self.file.close()
+                try:
+                    os.replace(self.journal_filename, self.compacting_filename)
+                except OSError as e:
+                    # On Windows a journal that another process has open cannot be renamed, keep appending to it
+                    self.file = open(self.journal_filename, "a", encoding="utf-8", newline="\n")
+                    print(f"Error compacting transactions: {e}")
+                    self.compaction_lock.release()
+                    return merge is not None
+                self.generation += 1
+                # The old journal describes every change, merged rows included, so others can follow without reloading
+                header = json.dumps({"op": "generation", "generation": self.generation}, separators=(",", ":")) + "\n"
+                self.file = open(self.journal_filename, "a", encoding="utf-8", newline="\n")
+                self.file.write(header)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.journal_records = 0
+                self.journal_offset = len(header)
+                snapshot = self.store.copy()  # Copy of the columns, later changes go to the new journal
+        except BaseException:
+            self.compaction_lock.release()
+            raise
+        if background:
+            self.compaction_thread = threading.Thread(target=self.write_compacted_snapshot, args=(snapshot,),
+                                                      daemon=True)
+            self.compaction_thread.start()
+            return True
+        return self.write_compacted_snapshot(snapshot)
+
+    # Function that merges a store of imported rows and journals them as add records, with the ledger lock held
+    def merge_locked(self, merge):
+        first_slot = len(self.store.ids)
+        self.store.merge(merge)
+        self.append_many([{"op": "add", "category": self.store.category(slot), **self.store.transaction(slot)}
+                          for slot in range(first_slot, len(self.store.ids))])
+
+    # Function that waits until a background compaction is done, it must not be called with the ledger locked
+    # because the compaction takes the lock to replace the snapshot
+    def wait_for_compaction(self):
+        thread = self.compaction_thread
+        if thread is not None:
+            thread.join()
+
+    def write_compacted_snapshot(self, snapshot):
+        try:
+            write_snapshot(snapshot, self.compact_filename, replace=False, binary=is_binary_ledger(self.filename))
+            with self.locked(catch_up=False):
+                os.replace(self.compacting_filename, self.previous_filename)  # Kept for processes still reading it
+                os.replace(self.compact_filename, self.filename)
+            return True
+        except OSError as e:
+            print(f"Error compacting transactions: {e}")
+            return False
+        finally:
+            self.compaction_lock.release()
+            self.compaction_thread = None
+
+    def close(self, compact=True):
+        if compact and self.journal_records:
+            self.compact()
+        self.wait_for_compaction()
+        if self.file is not None:
+            with self.lock:
+                if self.sync_timer is not None:
+                    self.sync_timer.cancel()
+                    self.sync_timer = None
+                self.sync_locked()
+                self.file.close()
+                self.file = None
+        self.ledger_lock.close()
+        self.compaction_lock.close()
+
+
+# Function that records a change in the journal, or saves the whole ledger when no journal is open
+def record_change(record):
+    if journal is not None:
+        journal.append(record)
+    else:
+        save_transactions(transactions)
 
 
+# Function that returns a context manager that holds the ledger lock while a change is made and journaled, with the
+# changes of other processes applied first. With reload False it yields False instead of reloading the whole ledger.
+def ledger_locked(reload=True):
+    if journal is not None and journal.loaded:
+        return journal.locked(reload=reload)
+    return contextlib.nullcontext(True)
+
+
+# Function that opens the ledger file with its journal. The global store is loaded right away, or with lazy
+# only when ensure_ledger_loaded is first called, so changes that need no data can be journaled immediately.
+def open_ledger(filename=TRANSACTIONS_FILE, lazy=False):
+    global journal
+    journal = TransactionJournal(transactions, filename)
+    if lazy:
+        journal.open_for_append()
+    else:
+        journal.recover()
+    return journal
+
+
+# Function that converts a ledger between the JSON and binary formats, including its journal
+def convert_ledger(source, destination):
+    store = TransactionStore()
+    source_journal = TransactionJournal(store, source)
+    source_journal.recover()
+    source_journal.close(compact=False)
+    write_snapshot(store, destination)
+    print(f"Converted {len(store)} transactions from {source} to {destination}.")
+    if store.invalid_rows and is_binary_ledger(destination):
+        print(f"{len(store.invalid_rows)} invalid transactions cannot be stored in the binary format and were left "
+              f"out, they remain in {source}.")
+    return store
+
+
+# Function that loads the ledger into the global store if that has not happened yet
+def ensure_ledger_loaded():
+    if journal is None:
+        open_ledger()
+    elif not journal.loaded:
+        journal.recover()
+
+
+# Class that times the instrumented operations into latency histograms with row counts, and records a trace that
+# opens in chrome://tracing or Perfetto. Nothing is wrapped unless enable_instrumentation is called.
+class Instrumentation:
+    BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, float("inf"))  # Upper bounds, s
+    MAX_TRACE_EVENTS = 100000
+
+    def __init__(self, mode="json", output="finance_tracker_profile"):
+        self.mode = mode  # "json" writes the trace, "pstats" also profiles every function call with cProfile
+        self.output = output  # Reports go to output + ".json" and output + ".pstats"
+        self.operations = {}  # Name -> {"calls", "errors", "rows", "total_seconds", "max_seconds", "histogram"}
+        self.trace = []
+        self.lock = threading.Lock()  # Operations also run on the GUI worker thread
+        self.started = time.perf_counter()
+        self.profiler = None
+        if mode == "pstats":
+            import cProfile  # Only imported when profiling, so the other modes start without it
+            self.profiler = cProfile.Profile()  # Profiles the thread that enabled it
+            self.profiler.enable()
+
+    # Function that returns function wrapped with a timer, rows(result, args) counts the rows it handled
+    def wrap(self, name, function, rows=None):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                self.record(name, start, time.perf_counter() - start, None, error=True)
+                raise
+            self.record(name, start, time.perf_counter() - start, rows(result, args) if rows is not None else None)
+            return result
+        return timed
+
+    def record(self, name, start, seconds, rows, error=False):
+        with self.lock:
+            operation = self.operations.get(name)
+            if operation is None:
+                operation = self.operations[name] = {"calls": 0, "errors": 0, "rows": 0, "total_seconds": 0.0,
+                                                     "max_seconds": 0.0, "histogram": [0] * len(self.BUCKETS)}
+            operation["calls"] += 1
+            operation["errors"] += error
+            operation["rows"] += rows or 0
+            operation["total_seconds"] += seconds
+            operation["max_seconds"] = max(operation["max_seconds"], seconds)
+            operation["histogram"][bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            if len(self.trace) < self.MAX_TRACE_EVENTS:
+                self.trace.append({"name": name, "ph": "X", "ts": (start - self.started) * 1e6, "dur": seconds * 1e6,
+                                   "pid": os.getpid(), "tid": threading.get_ident(),
+                                   "args": {"rows": rows} if rows is not None else {}})
+
+    # Function that wraps the Treeview refresh, sorting, searching and summary of a FinanceTrackerGUI instance
+    def instrument_gui(self, gui):
+        gui.render_rows = self.wrap("treeview_refresh", gui.render_rows, lambda result, args: gui.visible_rows)
+        gui.display_transactions = self.wrap("display_transactions", gui.display_transactions,
+                                             lambda result, args: len(gui.rows))
+        gui.sort_by = self.wrap("sort_by", gui.sort_by, lambda result, args: len(gui.rows))
+        gui.update_transaction_summary = self.wrap("update_transaction_summary", gui.update_transaction_summary)
+        build_search = gui.build_search
+
+        def instrumented_build_search(criteria, query):
+            search = build_search(criteria, query)
+            if search is None:
+                return None
+            return self.wrap(f"search_{criteria.lower()}", search, lambda result, args: len(result[0]))
+
+        gui.build_search = instrumented_build_search
+
+    # Function that writes the reports and prints the operations to file, it can be called again for a later report
+    def report(self, file=None):
+        file = file or sys.stdout
+        with self.lock:
+            operations = {name: dict(operation, histogram=dict(zip(map(str, self.BUCKETS), operation["histogram"])))
+                          for name, operation in self.operations.items()}
+            trace = list(self.trace)
+        with open(self.output + ".json", "w") as trace_file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms", "operations": operations}, trace_file)
+        print(f"\n{'Operation':32}{'Calls':>8}{'Rows':>12}{'Total ms':>12}{'Mean ms':>10}{'Max ms':>10}", file=file)
+        for name, operation in sorted(operations.items(), key=lambda item: -item[1]["total_seconds"]):
+            total = operation['total_seconds'] * 1000
+            print(f"{name:32}{operation['calls']:>8}{operation['rows']:>12}{total:>12.1f}"
+                  f"{total / operation['calls']:>10.1f}{operation['max_seconds'] * 1000:>10.1f}", file=file)
+        print(f"Trace written to {self.output}.json", file=file)
+        if self.profiler is not None:
+            self.profiler.disable()
+            import pstats  # Only needed when a profiler is running
+            self.profiler.dump_stats(self.output + ".pstats")
+            pstats.Stats(self.profiler, stream=file).sort_stats("cumulative").print_stats(25)
+            print(f"Profile written to {self.output}.pstats", file=file)
+            self.profiler.enable()
+
+
+instrumentation = None  # Instrumentation once enable_instrumentation has been called
+
+
+# Function that replaces the hot paths with timed wrappers. Without it the functions run unwrapped.
+def enable_instrumentation(mode="json", output=None):
+    global instrumentation, load_transactions, save_transactions, read_bulk_transactions_from_file
+    global import_transactions_from_files, export_transactions, display_summary, analyze_transactions
+    if instrumentation is not None:
+        return instrumentation
+    instrumentation = Instrumentation(mode, output or os.environ.get("FINANCE_TRACKER_PROFILE_FILE",
+                                                                    "finance_tracker_profile"))
+    wrap = instrumentation.wrap
+    load_transactions = wrap("load_transactions", load_transactions, lambda result, args: len(result))
+    save_transactions = wrap("save_transactions", save_transactions, lambda result, args: len(args[0]))
+    read_bulk_transactions_from_file = wrap("read_bulk_transactions_from_file", read_bulk_transactions_from_file,
+                                            lambda result, args: result.imported if result is not None else 0)
+    import_transactions_from_files = wrap("import_transactions_from_files", import_transactions_from_files,
+                                          lambda result, args: sum(item.imported for item in result if item))
+    export_transactions = wrap("export_transactions", export_transactions, lambda result, args: result.exported)
+    display_summary = wrap("display_summary", display_summary, lambda result, args: len(args[0]))
+    analyze_transactions = wrap("analyze_transactions", analyze_transactions, lambda result, args: result.count)
+    TransactionStore.sort_permutation = wrap("sort_permutation", TransactionStore.sort_permutation,
+                                             lambda result, args: len(result))
+    IncrementalSearch.search = wrap("live_search", IncrementalSearch.search,
+                                    lambda result, args: len(result[0]) if result is not None else 0)
+    return instrumentation
 
 
 def main_menu():
@@ -243,12 +2825,18 @@ def main_menu():
         print("2. View Transactions")
         print("3. Update Transaction")
         print("4. Delete Transaction")
-        print("5. Export Transactions to JSON File")
+        print("5. Export Transactions to File")
         print("6. Read Transactions in Bulk from Text File")
         print("7.Run GUI")
         print("8. Exit")
+        print("9. Display Summary")
 
         choice = input("Enter your choice: ")  # Get user choice
+        if choice in ("1", "2", "3", "4", "5", "6", "7", "9"):
+            ensure_ledger_loaded()  # The ledger is only loaded once an option needs it
+            if choice in ("1", "3", "4", "6") and transactions.load_error is not None:
+                print(f"The ledger cannot be changed because it could not be loaded. {transactions.load_error}")
+                continue
 
         # Branch based on user choice
         if choice == "1":
@@ -262,12 +2850,24 @@ def main_menu():
         elif choice == "5":
             export_transactions_to_file()  # Export transactions to file
         elif choice == "6":
-            filename = input("Enter the name of the text file: ")
-            bulk_transactions = read_bulk_transactions_from_file(filename)
-            if bulk_transactions:
-                transactions.update(bulk_transactions)
-        elif choice == "6":
-            display_summary(transactions)  # Display summary of transactions
+            filename = input("Enter the name of the text file, a directory or a pattern like exports/*.csv: ")
+            staging = TransactionStore()  # Merged into the ledger when it is saved
+            if os.path.isdir(filename) or any(character in filename for character in "*?["):
+                results = import_transactions_from_files(filename, staging)  # Import every matching file in parallel
+            else:
+                results = [read_bulk_transactions_from_file(filename, staging, progress=print_import_progress)]
+                print()
+            for result in results:
+                if result is not None:
+                    print_import_result(result)
+            if any(result is not None and result.imported for result in results):
+                # Fold the imported transactions into the snapshot
+                if not save_transactions(transactions, merge=staging):
+                    print("The imported transactions could not be saved.")
+        elif choice == "9":
+            start_date = get_optional_date("Enter start date (YYYY-MM-DD) or leave blank for all: ")
+            end_date = get_optional_date("Enter end date (YYYY-MM-DD) or leave blank for all: ")
+            display_summary(transactions, start_date, end_date)  # Display summary of transactions
         elif choice == "7":
             if transactions:  # Check if transactions dictionary has data
                 view_transactions_using_GUI()
@@ -275,8 +2875,15 @@ def main_menu():
                 print("No transactions loaded yet. Please add transactions or load from a file.")
             # Pass transactions to GUI function
         elif choice == "8":
-            save_transactions(transactions)  # Save transactions to file
-            print("Transactions saved successfully")
+            saved = True
+            if journal is None or (journal.loaded and journal.journal_records):
+                saved = save_transactions(transactions)  # Save transactions to file, unless nothing changed
+            if journal is not None:
+                journal.close(compact=False)
+            if saved:
+                print("Transactions saved successfully")
+            if instrumentation is not None:
+                instrumentation.report()
             print("Exiting program.")
             break  # Exit program
         else:
@@ -289,71 +2896,74 @@ def add_transaction():
     transaction_type = get_valid_transaction_type()  # Get valid transaction type
     category = get_valid_transaction_category()  # Get valid transaction category
     date = get_valid_date()  # Get valid date
-    add_transaction_to_dictionary( transaction_type, category, amount, date)  # Add transaction
-    save_transactions(transactions)  # Save transactions to file
+    with ledger_locked():  # Other processes cannot take the new id before it is journaled
+        slot = add_transaction_to_dictionary( transaction_type, category, amount, date)  # Add transaction
+        record_change({"op": "add", "id": transactions.ids[slot], "category": category,
+                       "type": transaction_type.lower(), "amount": amount, "date": date})  # Save to the journal
+    print(f"Transaction added with ID {transactions.ids[slot]}.")
 
 
 
 # Function to add transaction to dictionary
 def add_transaction_to_dictionary(transaction_type, category, amount, date):
-    new_transaction = {"type": transaction_type, "amount": amount, "date": date}  # New transaction
-    if category not in transactions:
-        transactions[category] = [new_transaction]
-    else:
-        transactions[category].append(new_transaction)
+    return transactions.add(transaction_type, category, amount, date)  # Slot of the new transaction
 
 # Function to view transaction
 def view_transactions(transactions):
     if transactions:
-        for category, transaction_list in transactions.items():
+        for category in transactions.categories():
             print(f"\nCategory: {category}")
-            for index, transaction in enumerate(transaction_list, start=1):
+            for slot in transactions.slots_for_category(category):
+                transaction = transactions.transaction(slot)
                 print(
-                    f"{index}. Amount: ${transaction['amount']}, Type: {transaction['type'].title()}, Date: {transaction['date']}")
+                    f"ID {transaction['id']}. Amount: ${transaction['amount']}, Type: {transaction['type'].title()}, Date: {transaction['date']}")
     else:
         print("No transactions available.")
 
 
 # Function to update a transaction
 def update_transaction():
-    view_transactions(transactions)
-    category = input("Enter the category of the transaction you want to update: ")
+    if not transactions:
+        print("No transactions available.")
+        return
+    slot = get_valid_transaction_id("update")
+    transaction = transactions.transaction(slot)
+    transaction_id = transaction['id']
 
-    if category in transactions:
-        transaction_list = transactions[category]
-        index = get_valid_transaction_index(len(transaction_list))
-        transaction = transaction_list[index - 1]  # Adjust index to 0-based
+    print("\nCurrent Transaction Details:")
+    print(f"Category: {transactions.category(slot)}")
+    print(f"1. Amount: ${transaction['amount']}")
+    print(f"2. Type: {transaction['type'].title()}")
+    print(f"3. Date: {transaction['date']}")
 
-        print("\nCurrent Transaction Details:")
-        print(f"1. Amount: ${transaction['amount']}")
-        print(f"2. Type: {transaction['type'].title()}")
-        print(f"3. Date: {transaction['date']}")
+    field = int(input("Enter the number corresponding to the field you want to update: "))
 
-        field = int(input("Enter the number corresponding to the field you want to update: "))
+    if field == 1:
+        transaction['amount'] = get_valid_amount()
+    elif field == 2:
+        transaction['type'] = get_valid_transaction_type().lower()
+    elif field == 3:
+        transaction['date'] = get_valid_date()
 
-        if field == 1:
-            transaction['amount'] = get_valid_amount()
-        elif field == 2:
-            transaction['type'] = get_valid_transaction_type().lower()
-        elif field == 3:
-            transaction['date'] = get_valid_date()
+    with ledger_locked():
+        slot = transactions.slot_of(transaction_id)  # Changes from other processes may have moved or deleted it
+        if slot is None:
+            print("The transaction was deleted in the meantime.")
+            return
 
-        # Update the transaction in the transactions dictionary
-        transactions[category][index - 1] = transaction
+        # Update the transaction in the transaction store
+        transactions.update(slot, transaction['type'], transaction['amount'], transaction['date'])
 
-        # Save the updated transactions to the JSON file
-        save_transactions(transactions)
+        # Save the update to the journal
+        record_change({"op": "update", **transactions.transaction(slot)})
 
-        print("Transaction updated successfully.")
-    else:
-        print("Category not found.")
+    print("Transaction updated successfully.")
 
 
 def display_transactions_from_file(): # Function that displays transactions from file
     print("\nTransactions from file:")
-    for expense_type, transactions_list in transactions.items():
-        for transaction in transactions_list:
-            print(f"Expense Type: {expense_type}, Amount: {transaction['amount']}, Date: {transaction['date']}")
+    for expense_type, transaction in transactions.items():
+        print(f"Expense Type: {expense_type}, Amount: {transaction['amount']}, Date: {transaction['date']}")
     print("These Transactions saved successfully")
     save_transactions(transactions)
 # Function to update transaction field
@@ -361,87 +2971,115 @@ def display_transactions_from_file(): # Function that displays transactions from
 
 # Function to delete transaction
 def delete_transaction(transactions):
-    view_transactions(transactions)
-    category = input("Enter the category of the transaction you want to delete: ")
-
-    if category in transactions:
-        transaction_list = transactions[category]
-        index = get_valid_transaction_index(len(transaction_list))
-        del transaction_list[index - 1]  # Adjust index to 0-based
-        print("Transaction deleted successfully.")
-    else:
-        print("Category not found.")
+    if not transactions:
+        print("No transactions available.")
+        return
+    slot = get_valid_transaction_id("delete")
+    transaction_id = transactions.ids[slot]
+    with ledger_locked():
+        slot = transactions.slot_of(transaction_id)  # Changes from other processes may have moved or deleted it
+        if slot is None:
+            print("The transaction was deleted in the meantime.")
+            return
+        transactions.delete(slot)
+        record_change({"op": "delete", "id": transaction_id})
+    print("Transaction deleted successfully.")
 # Function to display summary
-def display_summary(transactions):
-    total_income = 0
-    total_expense = 0
-    for expense_type, transactions_list in transactions.items():
-        for transaction in transactions_list:
-            total_amount = transaction["amount"]
-            if total_amount > 0:
-                if transaction["type"] == "income":
-                    print("Summary of incomes")
-                    date = transaction["date"]
-                    if len(transactions_list) == 1:
-                        print(f"You received ${total_amount} on {date} as {expense_type}.")
-                    else:
-                        print(
-                            f"You received ${total_amount} between {transactions_list[0]['date']} and {transactions_list[-1]['date']} as {expense_type}.")
-                    total_income += total_amount
+def display_summary(transactions, start_date=None, end_date=None, categories=None):
+    report = analyze_transactions(transactions, start_date, end_date, categories)
+    for kind, heading in (("income", "Summary of incomes"), ("expense", "Summary of Expenses")):
+        entries = [entry for entry in report.by_category if entry["type"] == kind]
+        if entries:
+            print(heading)
+        for entry in entries:
+            if kind == "income":
+                if entry["count"] == 1:
+                    print(f"You received ${entry['total']} on {entry['first_date']} as {entry['category']}.")
                 else:
-                    if len(transactions_list) == 1:
-                        print("Summary of Expenses")
-                        date = transaction["date"]
-                        print(f"You spent ${total_amount} on {expense_type}, on {date}.")
-                    else:
-                        print(
-                            f"You spent ${total_amount} on {expense_type}, between {transactions_list[0]['date']} and {transactions_list[-1]['date']}.")
-                    total_expense += total_amount
-
-    net_balance = total_income - total_expense
+                    print(f"You received ${entry['total']} between {entry['first_date']} and {entry['last_date']} "
+                          f"as {entry['category']}.")
+            elif entry["count"] == 1:
+                print(f"You spent ${entry['total']} on {entry['category']}, on {entry['first_date']}.")
+            else:
+                print(f"You spent ${entry['total']} on {entry['category']}, between {entry['first_date']} and "
+                      f"{entry['last_date']}.")
+
+    if report.by_month:
+        print("\nMonthly summary:")
+        for month in report.by_month:
+            print(f"{month['month']}: income ${month['income']}, expense ${month['expense']}, net ${month['net']}")
+    for title, top in (("Top income categories", report.top_income_categories),
+                       ("Top expense categories", report.top_expense_categories)):
+        if top:
+            print(f"\n{title}:")
+            for category, total in top:
+                print(f"{category}: ${total}")
 
     print("\nSummary:")
-    print(f"Total Income: ${total_income}")
-    print(f"Total Expense: ${total_expense}")
-    print(f"Net Balance: ${net_balance}")
+    print(f"Total Income: ${report.total_income}")
+    print(f"Total Expense: ${report.total_expense}")
+    print(f"Net Balance: ${report.net_balance}")
 
 
 #Funtions that validate user inputs
-def get_valid_file_name():  # Function that gets valid file name from user
+def get_valid_file_name(extension='.txt'):  # Function that gets valid file name from user
     while True:  # Loop until a valid file name is entered
-        filename = input("Enter file name (Do not include .txt extension): ")
+        filename = input(f"Enter file name (Do not include {extension} extension): ")
         if any(characters in r'\/.,:*?"<>|' for characters in filename):
             print("Error! File name cannot contain symbols like . / \\ \" : , . * ? < > |")
         else:
-            filename += '.txt'  # Append '.txt' if not already included
-            if filename == '.txt':  # Check if the filename is only '.txt'
+            filename += extension  # Append the extension if not already included
+            if filename == extension:  # Check if the filename is only the extension
                 print("Error: Filename cannot be empty.")
             else:
                 return filename  # Return the valid filename
 
 
 def export_transactions_to_file(): # Function that exports transactions to file
-    filename = get_valid_file_name()
+    export_format = input("Enter export format (csv, ndjson, binary) or leave blank for csv: ").strip().lower() or "csv"
+    if export_format not in EXPORT_FORMATS:
+        print("Error! Export format must be csv, ndjson or binary.")
+        return
+    filename = get_valid_file_name(EXPORT_FORMATS[export_format])
+    start_date = get_optional_date("Enter start date (YYYY-MM-DD) or leave blank for all: ")
+    end_date = get_optional_date("Enter end date (YYYY-MM-DD) or leave blank for all: ")
+    category = input("Enter category or leave blank for all: ").strip()
+    while True:
+        transaction_type = input("Enter transaction type (Income/Expense) or leave blank for all: ").strip().lower()
+        if transaction_type in ("", "income", "expense"):
+            break
+        print("Error! Transaction type must be 'Income' or 'Expense'. Please try again.")
+    compress = input("Compress with gzip? (y/n): ").strip().lower() == "y"
+    if compress:
+        filename += ".gz"
     try:
-        with open(filename, "w") as file:
-            for category, transactions_list in transactions.items():
-                for transaction in transactions_list:
-                    file.write(f"{transaction['type']},{category},{transaction['amount']},{transaction['date']}\n")
+        result = export_transactions(filename, transactions, export_format, start_date, end_date,
+                                     [category] if category else None, transaction_type or None, compress,
+                                     progress=print_export_progress)
+        print()
+        print_export_result(result)
         print("Transactions exported successfully.")
     except Exception as e: # Handle the exceptions that occur during the process
         print(f"Error exporting transactions: {e}")
 
-# Function to get valid amount
-def get_valid_transaction_index(max_index):
+# Function that asks for the id of a transaction and returns its slot, L lists the transactions first
+def get_valid_transaction_id(action):
     while True:
+        entered = input(f"Enter the ID of the transaction you want to {action} (L to list transactions): ").strip()
+        if entered.lower() == "l":
+            view_transactions(transactions)
+            continue
         try:
-            index = int(input("Enter the index of the transaction you want to update: "))
-            if index < 1 or index > max_index:
-                print(f"Error! Index must be between 1 and {max_index}. Please try again.")
-            else:
-                return index
+            slot = transactions.slot_of(int(entered))
         except ValueError:
-            print("Error! Please enter a valid index.")
+            print("Error! Please enter a valid ID.")
+            continue
+        if slot is None:
+            print("Error! No transaction has that ID. Please try again.")
+        else:
+            return slot
+
+# Function to get valid amount
 
 def get_valid_amount():
     while True:
@@ -482,7 +3120,241 @@ def get_valid_date():
         except ValueError:
             print("Error! Invalid date. Please try again.")
 
-if __name__ == "__main__":
-    load_transactions("transactions.json")  # Call function that loads data on startup
-    main_menu()  # Call function that displays main menu
+# Function to get an optional date, blank means no limit
+def get_optional_date(prompt):
+    while True:
+        date = input(prompt).strip()
+        if not date:
+            return None
+        try:
+            datetime.datetime.strptime(date, '%Y-%m-%d')
+            return date
+        except ValueError:
+            print("Error! Invalid date. Please try again.")
+
+# Function that prints one JSON document on one line, the output of a batch command
+def print_json(data, file=None):
+    file = file or sys.stdout
+    json.dump(data, file, separators=(",", ":"))
+    file.write("\n")
+
+
+# Function that describes an import for the batch output
+def import_result_json(result):
+    return {"filename": result.filename, "imported": result.imported, "bad_row_count": result.bad_row_count,
+            "bad_rows": result.bad_rows, "seconds": round(result.elapsed, 3)}
+
+
+# Function that parses type,category,amount,date CSV or NDJSON lines from a file into rows, validating all of them
+def parse_transaction_lines(file, input_format="csv"):
+    result = ImportResult(getattr(file, "name", "<stdin>"))
+    rows = []
+    if input_format == "csv":
+        reader = csv.reader(file)
+        for parts in reader:
+            if parts:
+                try:
+                    rows.append(parse_transaction_row(parts))
+                except ValueError as e:
+                    result.skip(reader.line_num, str(e))
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                try:
+                    transaction = json.loads(line)
+                    rows.append(parse_transaction_row([str(transaction[key]) for key in
+                                                       ("type", "category", "amount", "date")]))
+                except (ValueError, KeyError, TypeError) as e:
+                    result.skip(line_number, f"invalid transaction: {e}")
+    result.imported = len(rows)
+    return rows, result
+
+
+# Function that writes the loaded ledger as a new snapshot and tells whether that worked. A failed compaction
+# leaves its journal behind for the next load.
+def batch_save():
+    return journal.compact()
+
+
+def batch_import(arguments):
+    store = TransactionStore()
+    results = []
+    for pattern in arguments.files:
+        if os.path.isdir(pattern) or any(character in pattern for character in "*?["):
+            results.extend(import_transactions_from_files(pattern, store, workers=arguments.workers))
+        else:
+            results.append(read_bulk_transactions_from_file(pattern, store))
+    if not results or any(result is None for result in results):
+        return 1, {"error": "some files could not be read", "files": [import_result_json(result)
+                                                                    for result in results if result is not None]}
+    bad_row_count = sum(result.bad_row_count for result in results)
+    imported = sum(result.imported for result in results)
+    if arguments.strict and bad_row_count:
+        imported = 0
+    if imported and not save_transactions(transactions, merge=store):
+        return 1, {"error": "the ledger could not be saved, the imported transactions were not kept"}
+    return 1 if arguments.strict and bad_row_count else 0, {
+        "imported": imported, "bad_row_count": bad_row_count, "transactions": len(transactions),
+        "files": [import_result_json(result) for result in results]}
+
+
+# Function that journals validated rows from standard input without loading the ledger, they are folded into
+# the snapshot by the next compaction
+def batch_add(arguments):
+    rows, result = parse_transaction_lines(sys.stdin, arguments.format)
+    if arguments.strict and result.bad_row_count:
+        return 1, {"added": 0, "bad_row_count": result.bad_row_count, "bad_rows": result.bad_rows}
+    journal.append_many([{"op": "add", "category": category, "type": TRANSACTION_TYPES[type_code], "amount": amount,
+                          "date": ordinal_to_date(ordinal)} for type_code, category, amount, ordinal in rows])
+    return 0, {"added": len(rows), "bad_row_count": result.bad_row_count, "bad_rows": result.bad_rows}
+
+
+def batch_export(arguments):
+    compress = arguments.gzip or arguments.file.endswith(".gz")
+    result = export_transactions(arguments.file, transactions, arguments.format, arguments.start_date,
+                                 arguments.end_date, arguments.category, arguments.type, compress)
+    return 0, {"filename": result.filename, "exported": result.exported, "file_size": result.file_size,
+               "seconds": round(result.elapsed, 3), "rows_per_second": round(result.rows_per_second)}
+
+
+# Function that prints the transactions matching every given criterion as JSON lines, or only their totals
+def batch_search(arguments):
+    searcher = IncrementalSearch(transactions)
+    matches = None
+    for criteria in ("Amount", "Type", "Category", "Date"):
+        query = getattr(arguments, criteria.lower())
+        if query is None:
+            continue
+        result = searcher.search(criteria, query)
+        if result is None:
+            return 1, {"error": f"invalid {criteria.lower()} query {query!r}"}
+        matches = result[0] if matches is None else sorted(set(matches).intersection(result[0]))
+    if matches is None:
+        matches = transactions.slots()
+    if arguments.limit is not None:
+        matches = matches[:arguments.limit]
+    income, expense, net_balance = transactions.totals.slots_summary(matches)
+    if not arguments.summary:
+        for slot in matches:
+            print_json({"category": transactions.category(slot), **transactions.transaction(slot)}, arguments.output)
+        return 0, None
+    return 0, {"count": len(matches), "total_income": income, "total_expense": expense, "net_balance": net_balance}
+
+
+def batch_summary(arguments):
+    report = analyze_transactions(transactions, arguments.start_date, arguments.end_date, arguments.category,
+                                  arguments.top)
+    return 0, vars(report)
+
+
+def batch_compact(arguments):
+    if not batch_save():
+        return 1, {"error": "the ledger could not be saved"}
+    return 0, {"transactions": len(transactions), "ledger": journal.filename}
+
+
+def batch_convert(arguments):
+    store = convert_ledger(arguments.source, arguments.destination)
+    return 0, {"source": arguments.source, "destination": arguments.destination, "transactions": len(store)}
+
+
+# Function that builds the parser of the batch command line, without a command the interactive menu runs
+def build_argument_parser():
+    parser = argparse.ArgumentParser(description="Personal Finance Tracker. Without a command the interactive menu "
+                                                 "starts, commands print their result as JSON.")
+    parser.add_argument("--ledger", default=TRANSACTIONS_FILE, help="ledger file, .ftb for the binary format")
+    parser.add_argument("--profile", action="store_true", help="write operation timings and a trace on exit")
+    parser.add_argument("--profile-mode", choices=("json", "pstats"), default="json",
+                        help="json writes the trace, pstats also writes a cProfile report (default: json)")
+    commands = parser.add_subparsers(dest="command")
+
+    def date(value):
+        datetime.datetime.strptime(value, '%Y-%m-%d')
+        return value
+
+    def transaction_type(value):
+        if value.lower() not in TRANSACTION_TYPES:
+            raise argparse.ArgumentTypeError("must be income or expense")
+        return value.lower()
+
+    def add_filters(command):
+        command.add_argument("--from", dest="start_date", type=date, help="first date, YYYY-MM-DD")
+        command.add_argument("--to", dest="end_date", type=date, help="last date, YYYY-MM-DD")
+        command.add_argument("--category", action="append", help="category to include, can be repeated")
+
+    command = commands.add_parser("import", help="import type,category,amount,date files, directories or patterns")
+    command.add_argument("files", nargs="+")
+    command.add_argument("--workers", type=int, help="processes for directories and patterns")
+    command.add_argument("--strict", action="store_true", help="import nothing if any row is invalid")
+    command.set_defaults(run=batch_import, load=True)
+
+    command = commands.add_parser("add", help="add transactions read from standard input, without loading the ledger")
+    command.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    command.add_argument("--strict", action="store_true", help="add nothing if any row is invalid")
+    command.set_defaults(run=batch_add, load=False)
+
+    command = commands.add_parser("export", help="export transactions to a csv, ndjson or binary file")
+    command.add_argument("file")
+    command.add_argument("--format", choices=tuple(EXPORT_FORMATS), default="csv")
+    command.add_argument("--type", type=transaction_type)
+    command.add_argument("--gzip", action="store_true", help="compress, implied by a .gz file name")
+    add_filters(command)
+    command.set_defaults(run=batch_export, load=True)
+
+    command = commands.add_parser("search", help="print matching transactions as JSON lines")
+    command.add_argument("--amount", help="amount or LOW..HIGH")
+    command.add_argument("--type")
+    command.add_argument("--category", help="category prefix")
+    command.add_argument("--date", help="date prefix like 2024-03 or FIRST..LAST")
+    command.add_argument("--limit", type=int)
+    command.add_argument("--summary", action="store_true", help="print only the count and totals")
+    command.set_defaults(run=batch_search, load=True)
+
+    command = commands.add_parser("summary", help="print totals by category, month and year")
+    command.add_argument("--top", type=int, default=5, help="categories in the top lists")
+    add_filters(command)
+    command.set_defaults(run=batch_summary, load=True)
+
+    command = commands.add_parser("compact", help="fold the journal into a new snapshot")
+    command.set_defaults(run=batch_compact, load=True)
+
+    command = commands.add_parser("convert", help="write a ledger and its journal as a snapshot in another format")
+    command.add_argument("source")
+    command.add_argument("destination")
+    command.set_defaults(run=batch_convert, load=None)
+    return parser
+
+
+# Function that runs the command line: one load and at most one save per command, the result goes to standard
+# output as JSON and failures give a non-zero exit status
+def main(argv=None):
+    arguments = build_argument_parser().parse_args(argv)
+    profile = os.environ.get("FINANCE_TRACKER_PROFILE", "")
+    if arguments.profile:
+        enable_instrumentation(arguments.profile_mode)
+    elif profile and profile != "0":
+        enable_instrumentation("pstats" if profile == "pstats" else "json")
+    if arguments.command is None:
+        open_ledger(arguments.ledger, lazy=True)  # Open the ledger, its data is loaded when an option first needs it
+        main_menu()  # Call function that displays main menu
+        return 0
+    arguments.output = sys.stdout
+    try:
+        with contextlib.redirect_stdout(sys.stderr):  # Messages printed along the way must not mix with the JSON
+            if arguments.load is not None:
+                open_ledger(arguments.ledger, lazy=not arguments.load)
+            status, result = arguments.run(arguments)
+    except (OSError, ValueError, KeyError) as e:
+        status, result = 1, {"error": str(e)}
+    finally:
+        if journal is not None:
+            journal.close(compact=False)
+        if instrumentation is not None:
+            instrumentation.report(sys.stderr)
+    if result is not None:
+        print_json(result)
+    return status
 
+
+if __name__ == "__main__":
+    sys.exit(main())
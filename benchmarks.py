@@ -0,0 +1,304 @@
+import argparse  # Import argparse for the benchmark command line
+import contextlib  # Import contextlib for silencing the printed summary
+import io  # Import io for capturing the printed summary
+import json  # Import json for the machine-readable results
+import os  # Import os for file and CPU information
+import platform  # Import platform for describing the machine in the results
+import random  # Import random for the synthetic ledger generator
+import statistics  # Import statistics for the median of repeated timings
+import subprocess  # Import subprocess for measuring cold starts in fresh interpreters
+import sys  # Import sys for locating the interpreter
+import tempfile  # Import tempfile for the generated data directory
+import time  # Import time for timing the benchmarks
+
+import Pythoncode as tracker  # Import the finance tracker being measured
+
+
+# Function that writes a deterministic synthetic type,category,amount,date bulk file
+def generate_bulk_file(filename, rows, categories=50, start_date="2020-01-01", days=1460, income_ratio=0.3, seed=0):
+    rng = random.Random(seed)
+    category_names = [f"category{number}" for number in range(categories)]
+    dates = [tracker.ordinal_to_date(tracker.date_to_ordinal(start_date) + day) for day in range(days)]
+    with open(filename, "w", newline="") as file:
+        for start in range(0, rows, 100000):
+            file.writelines(
+                f"{'income' if rng.random() < income_ratio else 'expense'},{rng.choice(category_names)},"
+                f"{rng.randint(100, 500000) / 100},{rng.choice(dates)}\n"
+                for _ in range(min(100000, rows - start)))
+
+
+# Function that builds a deterministic synthetic ledger in a TransactionStore
+def generate_store(rows, categories=50, start_date="2020-01-01", days=1460, income_ratio=0.3, seed=0):
+    rng = random.Random(seed)
+    category_names = [f"category{number}" for number in range(categories)]
+    first_day = tracker.date_to_ordinal(start_date)
+    store = tracker.TransactionStore()
+    for start in range(0, rows, 100000):
+        store.extend([(0 if rng.random() < income_ratio else 1, rng.choice(category_names),
+                       rng.randint(100, 500000) / 100, first_day + rng.randrange(days))
+                      for _ in range(min(100000, rows - start))])
+    return store
+
+
+# Function that writes several synthetic bulk files into a directory, like a batch of monthly exports
+def generate_bulk_files(directory, files, rows_per_file, seed=0):
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for number in range(files):
+        filename = os.path.join(directory, f"export{number:04d}.csv")
+        if not os.path.exists(filename):
+            generate_bulk_file(filename, rows_per_file, seed=seed + number)
+        filenames.append(filename)
+    return filenames
+
+
+# Function that times the parallel importer with increasing worker counts and reports the speedup
+def benchmark_parallel_import(directory, files, rows_per_file, worker_counts):
+    filenames = generate_bulk_files(directory, files, rows_per_file)
+    total_bytes = sum(os.path.getsize(filename) for filename in filenames)
+    print(f"{files} files, {files * rows_per_file} rows, {total_bytes / 2 ** 30:.2f} GiB, "
+          f"{os.cpu_count()} CPUs")
+    results = []
+    for workers in worker_counts:
+        store = tracker.TransactionStore()
+        start = time.perf_counter()
+        tracker.import_transactions_from_files(directory, store, workers=workers)
+        elapsed = time.perf_counter() - start
+        speedup = results[0]["seconds"] / elapsed if results else 1.0
+        results.append({"workers": workers, "seconds": elapsed, "rows": len(store),
+                        "rows_per_second": len(store) / elapsed, "speedup": speedup})
+        print(f"{workers:>3} workers: {elapsed:8.2f} s {len(store) / elapsed:>12,.0f} rows/s "
+              f"speedup {speedup:5.2f}x (ideal {workers / worker_counts[0]:.0f}x)")
+    return results
+
+
+COLD_START_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import Pythoncode
+imported = time.perf_counter()
+Pythoncode.load_transactions(sys.argv[1])
+loaded = time.perf_counter()
+try:
+    import resource
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    peak_kib = None
+print(imported - start, loaded - imported, len(Pythoncode.transactions), "tkinter" in sys.modules, peak_kib)
+"""
+
+
+# Function that measures importing the tracker and loading a ledger in fresh interpreters
+def benchmark_cold_start(filename, rows, repeats=3):
+    if not os.path.exists(filename):
+        tracker.write_snapshot(generate_store(rows), filename)
+    print(f"{filename}: {os.path.getsize(filename) / 2 ** 20:.1f} MiB")
+    results = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT, filename], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(tracker.__file__))).stdout.split()
+        import_seconds, load_seconds = float(output[0]), float(output[1])
+        results.append({"import_seconds": import_seconds, "load_seconds": load_seconds, "rows": int(output[2]),
+                        "tkinter_imported": output[3] == "True",
+                        "peak_kib": None if output[4] == "None" else int(output[4])})
+        print(f"import {import_seconds * 1000:7.1f} ms, load {load_seconds:6.2f} s, {output[2]} rows, "
+              f"tkinter imported: {output[3]}, peak memory {output[4]} KiB")
+    return results
+
+
+# Function that runs function repeats times and returns its best and median time, setup runs untimed before each run
+def measure(function, repeats=3, rows=None, setup=None):
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    result = {"best_seconds": min(times), "median_seconds": statistics.median(times), "repeats": repeats}
+    if rows is not None:
+        result["rows"] = rows
+        result["rows_per_second"] = rows / min(times) if min(times) else None
+    return result
+
+
+# Search queries timed by the suite with the semantics of the Search button, where a category matches exactly
+# unless it ends with *
+SEARCH_CASES = {
+    "amount_exact": ("Amount", "250.00"),
+    "amount_range": ("Amount", "100..1000"),
+    "type": ("Type", "income"),
+    "category_exact": ("Category", "category1"),
+    "category_prefix": ("Category", "category1*"),
+    "date_day": ("Date", "2021-03-15"),
+    "date_month": ("Date", "2021-03"),
+    "date_range": ("Date", "2021-01-01..2021-06-30"),
+}
+
+# Queries timed with the semantics of search-as-you-type, where categories and dates always match by prefix
+LIVE_SEARCH_CASES = {
+    "amount_range": ("Amount", "100..1000"),
+    "type": ("Type", "inc"),
+    "category_prefix": ("Category", "category1"),
+    "category_prefix_all": ("Category", "category"),
+    "date_day": ("Date", "2021-03-15"),
+    "date_month": ("Date", "2021-03"),
+    "date_range": ("Date", "2021-01-01..2021-06-30"),
+}
+
+
+# Function that times the tracker's hot paths on a synthetic ledger and returns the results as a dictionary.
+# GUI operations are timed on the model layer the GUI calls into, so no display is needed.
+def benchmark_suite(rows, categories=50, days=1460, income_ratio=0.3, repeats=3, directory=None):
+    results = {}
+    with tempfile.TemporaryDirectory(dir=directory) as directory:
+        def run(name, function, **options):
+            results[name] = measure(function, repeats, **options)
+            print(f"{name:32} {results[name]['best_seconds'] * 1000:10.1f} ms", file=sys.stderr)
+
+        run("generate", lambda: generate_store(rows, categories, days=days, income_ratio=income_ratio), rows=rows)
+        store = generate_store(rows, categories, days=days, income_ratio=income_ratio)
+
+        json_file = os.path.join(directory, "ledger.json")
+        binary_file = os.path.join(directory, "ledger" + tracker.BINARY_EXTENSION)
+        saved_file = tracker.TRANSACTIONS_FILE
+        try:
+            for name, filename in (("json", json_file), ("binary", binary_file)):
+                tracker.TRANSACTIONS_FILE = filename  # save_transactions writes the configured ledger file
+                run(f"save_transactions_{name}", lambda: tracker.save_transactions(store), rows=rows)
+                run(f"load_transactions_{name}",
+                    lambda: tracker.load_transactions(filename, tracker.TransactionStore()), rows=rows)
+        finally:
+            tracker.TRANSACTIONS_FILE = saved_file
+
+        bulk_file = os.path.join(directory, "bulk.csv")
+        generate_bulk_file(bulk_file, rows, categories, days=days, income_ratio=income_ratio)
+        run("read_bulk_transactions_from_file",
+            lambda: tracker.read_bulk_transactions_from_file(bulk_file, tracker.TransactionStore()), rows=rows)
+
+        for export_format in tracker.EXPORT_FORMATS:
+            export_file = os.path.join(directory, "export" + tracker.EXPORT_FORMATS[export_format])
+            run(f"export_{export_format}", lambda: tracker.export_transactions(export_file, store, export_format),
+                rows=rows)
+        run("export_csv_gzip", lambda: tracker.export_transactions(os.path.join(directory, "export.csv.gz"), store,
+                                                                    compress=True), rows=rows)
+
+    def drop_indexes():
+        store._indexes = None
+
+    run("build_indexes", lambda: store.indexes, rows=rows, setup=drop_indexes)
+    store.build_indexes()  # Also builds the totals, so the first search case does not pay for them
+    for name, (criteria, query) in SEARCH_CASES.items():
+        run(f"search_{name}", lambda: tracker.prepare_search(store, criteria, query)())
+    for name, (criteria, query) in LIVE_SEARCH_CASES.items():
+        run(f"live_search_{name}", lambda: tracker.IncrementalSearch(store).search(criteria, query))
+
+    def type_query(criteria, query):
+        live_search = tracker.IncrementalSearch(store)
+        for length in range(1, len(query) + 1):
+            live_search.search(criteria, query[:length])
+
+    run("search_as_you_type_category", lambda: type_query("Category", "category12"))
+    run("search_as_you_type_date", lambda: type_query("Date", "2021-03-15"))
+
+    def drop_sort_cache():
+        store._sort_cache = {}
+
+    for column in ("Amount", "Date", "Type", "Category"):
+        run(f"sort_by_{column.lower()}", lambda: store.sort_permutation(column)[::-1], rows=rows,
+            setup=drop_sort_cache)
+        run(f"sort_by_{column.lower()}_cached", lambda: store.sort_permutation(column)[::-1], rows=rows)
+
+    def drop_totals():
+        store._totals = None
+
+    run("update_transaction_summary", lambda: store.totals.summary(), rows=rows, setup=drop_totals)
+    run("update_transaction_summary_cached", lambda: store.totals.summary())
+
+    def display_summary():
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracker.display_summary(store)
+
+    run("display_summary", display_summary, rows=rows)
+    run("analyze_transactions_python", lambda: tracker.analyze_transactions(store, use_numpy=False), rows=rows)
+    if tracker.load_numpy() is not None:
+        run("analyze_transactions_numpy", lambda: tracker.analyze_transactions(store), rows=rows)
+
+    edited = random.Random(1).sample(list(store.ids), min(1000, rows))
+    run("update_by_id_1000", lambda: [store.update(store.slot_of(transaction_id), amount=1.0)
+                                      for transaction_id in edited])
+    copies = []
+    run("delete_by_id_1000", lambda: [copies[-1].delete(copies[-1].slot_of(transaction_id))
+                                      for transaction_id in edited], setup=lambda: copies.append(store.copy()))
+
+    return {"parameters": {"rows": rows, "categories": categories, "days": days, "income_ratio": income_ratio,
+                           "repeats": repeats},
+            "environment": {"python": platform.python_version(), "implementation": platform.python_implementation(),
+                            "platform": platform.platform(), "cpus": os.cpu_count(),
+                            "numpy": getattr(tracker.load_numpy(), "__version__", None)},
+            "results": results}
+
+
+# Function that prints how the best times of two suite result files compare, slower cases first
+def compare_results(baseline_file, current_file):
+    with open(baseline_file) as file:
+        baseline = json.load(file)["results"]
+    with open(current_file) as file:
+        current = json.load(file)["results"]
+    ratios = sorted(((current[name]["best_seconds"] / baseline[name]["best_seconds"], name)
+                     for name in current if name in baseline and baseline[name]["best_seconds"]), reverse=True)
+    for ratio, name in ratios:
+        print(f"{name:32} {baseline[name]['best_seconds'] * 1000:10.1f} ms "
+              f"{current[name]['best_seconds'] * 1000:10.1f} ms {ratio:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finance tracker benchmarks")
+    subcommands = parser.add_subparsers(dest="benchmark", required=True)
+
+    parallel = subcommands.add_parser("parallel-import", help="scaling of the multi-file importer, "
+                                      "e.g. --files 48 --rows-per-file 1000000 is about 1.7 GiB")
+    parallel.add_argument("--directory", default=os.path.join(tempfile.gettempdir(), "finance_tracker_bench"))
+    parallel.add_argument("--files", type=int, default=16)
+    parallel.add_argument("--rows-per-file", type=int, default=200000)
+    parallel.add_argument("--workers", type=int, nargs="+",
+                          default=sorted({1, 2, 4, 8, os.cpu_count() or 1} & set(range(1, (os.cpu_count() or 1) + 1))))
+
+    cold_start = subcommands.add_parser("cold-start", help="import time and ledger load time in a fresh process")
+    cold_start.add_argument("--file", default=os.path.join(tempfile.gettempdir(), "finance_tracker_cold_start.json"))
+    cold_start.add_argument("--rows", type=int, default=1000000)
+    cold_start.add_argument("--repeats", type=int, default=3)
+
+    suite = subcommands.add_parser("suite", help="time loading, saving, importing, exporting, searching, sorting and "
+                                   "summaries, and write the results as JSON")
+    suite.add_argument("--rows", type=int, default=100000)
+    suite.add_argument("--categories", type=int, default=50)
+    suite.add_argument("--days", type=int, default=1460, help="date span of the generated ledger")
+    suite.add_argument("--income-ratio", type=float, default=0.3)
+    suite.add_argument("--repeats", type=int, default=3)
+    suite.add_argument("--output", help="JSON file for the results, standard output by default")
+
+    compare = subcommands.add_parser("compare", help="compare two JSON results of the suite")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+
+    arguments = parser.parse_args()
+    if arguments.benchmark == "parallel-import":
+        benchmark_parallel_import(arguments.directory, arguments.files, arguments.rows_per_file, arguments.workers)
+    elif arguments.benchmark == "cold-start":
+        benchmark_cold_start(arguments.file, arguments.rows, arguments.repeats)
+    elif arguments.benchmark == "suite":
+        results = benchmark_suite(arguments.rows, arguments.categories, arguments.days, arguments.income_ratio,
+                                  arguments.repeats)
+        if arguments.output:
+            with open(arguments.output, "w") as file:
+                json.dump(results, file, indent=1)
+        else:
+            json.dump(results, sys.stdout, indent=1)
+            print()
+    elif arguments.benchmark == "compare":
+        compare_results(arguments.baseline, arguments.current)
+
+
+if __name__ == "__main__":
+    main()
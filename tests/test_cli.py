@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Pythoncode.py")
+
+
+class BatchCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    # Function that runs a command against the test ledger and returns (exit status, JSON lines printed)
+    def run_command(self, *arguments, stdin="", ledger="ledger.json"):
+        completed = subprocess.run([sys.executable, SCRIPT, "--ledger", self.path(ledger), *arguments],
+                                   input=stdin, capture_output=True, text=True, cwd=self.directory.name,
+                                   timeout=60)
+        return completed.returncode, [json.loads(line) for line in completed.stdout.splitlines()]
+
+    def write_file(self, name, text):
+        with open(self.path(name), "w", encoding="utf-8") as file:
+            file.write(text)
+        return self.path(name)
+
+    def test_import_search_and_summary(self):
+        bulk = self.write_file("bulk.csv", "income,Salary,1000,2024-01-31\nexpense,Rent,500,2024-02-01\n"
+                                           "expense,Food,12.5,2024-02-03\nexpense,Food,oops,2024-02-04\n")
+        status, (result,) = self.run_command("import", bulk)
+        self.assertEqual(status, 0)
+        self.assertEqual((result["imported"], result["bad_row_count"], result["transactions"]), (3, 1, 3))
+        status, lines = self.run_command("search", "--type", "expense", "--date", "2024-02")
+        self.assertEqual(status, 0)
+        self.assertEqual(sorted(line["category"] for line in lines), ["Food", "Rent"])
+        status, (totals,) = self.run_command("search", "--category", "f", "--summary")
+        self.assertEqual(totals, {"count": 1, "total_income": 0.0, "total_expense": 12.5, "net_balance": -12.5})
+        status, (summary,) = self.run_command("summary")
+        self.assertEqual((summary["total_income"], summary["total_expense"], summary["count"]), (1000.0, 512.5, 3))
+
+    def test_strict_import_keeps_nothing(self):
+        bulk = self.write_file("bulk.csv", "income,Salary,1000,2024-01-31\nexpense,Rent,-5,2024-02-01\n")
+        status, (result,) = self.run_command("import", "--strict", bulk)
+        self.assertEqual((status, result["imported"]), (1, 0))
+        self.assertFalse(os.path.exists(self.path("ledger.json")))
+
+    def test_add_journals_without_loading_and_compact_saves(self):
+        status, (result,) = self.run_command("add", stdin="expense,Rent,500,2024-02-01\nbad line\n")
+        self.assertEqual((status, result["added"], result["bad_row_count"]), (0, 1, 1))
+        status, (result,) = self.run_command("add", "--format", "ndjson", stdin=json.dumps(
+            {"type": "income", "category": "Salary", "amount": 1000, "date": "2024-01-31"}) + "\n")
+        self.assertEqual(result["added"], 1)
+        self.assertTrue(os.path.exists(self.path("ledger.json.journal")))
+        status, (result,) = self.run_command("compact")
+        self.assertEqual((status, result["transactions"]), (0, 2))
+        with open(self.path("ledger.json"), encoding="utf-8") as file:
+            self.assertEqual(sorted(json.load(file)), ["Rent", "Salary"])
+
+    def test_export_and_convert(self):
+        self.run_command("add", stdin="expense,Rent,500,2024-02-01\nincome,Salary,1000,2024-01-31\n")
+        status, (result,) = self.run_command("export", self.path("out.ndjson"), "--format", "ndjson",
+                                             "--type", "income")
+        self.assertEqual((status, result["exported"]), (0, 1))
+        status, (result,) = self.run_command("convert", self.path("ledger.json"), self.path("ledger.ftb"))
+        self.assertEqual((status, result["transactions"]), (0, 2))
+        status, (totals,) = self.run_command("search", "--summary", ledger="ledger.ftb")
+        self.assertEqual(totals["count"], 2)
+
+    def test_profile_flag_does_not_take_the_command(self):
+        status, (totals,) = self.run_command("--profile", "search", "--summary")
+        self.assertEqual((status, totals["count"]), (0, 0))
+        self.assertTrue(os.path.exists(self.path("finance_tracker_profile.json")))
+
+    def test_errors_give_a_non_zero_status(self):
+        status, (result,) = self.run_command("import", self.path("missing.csv"))
+        self.assertEqual(status, 1)
+        self.assertIn("error", result)
+        status, (result,) = self.run_command("search", "--amount", "abc")
+        self.assertEqual(status, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
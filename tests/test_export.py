@@ -0,0 +1,89 @@
+import gzip
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Pythoncode
+
+CATEGORIES = ["Food, drinks", 'He said "hi"', "Two\nlines", "Café", "Plain"]
+
+
+# Function that returns a store with rows in categories that need CSV quoting
+def make_store():
+    store = Pythoncode.TransactionStore()
+    for number in range(50):
+        store.add("income" if number % 4 == 0 else "expense", CATEGORIES[number % len(CATEGORIES)],
+                  0.1 * number + 0.2, f"2024-{number % 12 + 1:02d}-{number % 28 + 1:02d}")
+    return store
+
+
+# Function that returns the (amount, date, type, category) rows of a store
+def rows_of(store):
+    return sorted(store.row(slot) for slot in store.slots())
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.store = make_store()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_csv_round_trip_through_the_bulk_importer(self):
+        filename = self.path("export.csv")
+        result = Pythoncode.export_transactions(filename, self.store, "csv", batch_size=7)
+        self.assertEqual(result.exported, 50)
+        imported = Pythoncode.TransactionStore()
+        import_result = Pythoncode.read_bulk_transactions_from_file(filename, imported)
+        self.assertEqual(import_result.bad_row_count, 0)
+        self.assertEqual(rows_of(imported), rows_of(self.store))
+
+    def test_ndjson_lines_hold_every_field(self):
+        filename = self.path("export.ndjson")
+        Pythoncode.export_transactions(filename, self.store, "ndjson")
+        with open(filename, encoding="utf-8") as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(sorted(records, key=lambda record: record["id"]),
+                         [dict(self.store.transaction(slot), category=self.store.category(slot))
+                          for slot in self.store.slots()])
+
+    def test_gzip_matches_the_plain_export(self):
+        Pythoncode.export_transactions(self.path("export.csv"), self.store, "csv")
+        Pythoncode.export_transactions(self.path("export.csv.gz"), self.store, "csv", compress=True)
+        with open(self.path("export.csv"), "rb") as plain, gzip.open(self.path("export.csv.gz")) as compressed:
+            self.assertEqual(compressed.read(), plain.read())
+
+    def test_binary_export_loads_as_a_ledger(self):
+        filename = self.path("export.ftb")
+        Pythoncode.export_transactions(filename, self.store, "binary", categories=["Plain", "Café"])
+        loaded = Pythoncode.load_transactions(filename, Pythoncode.TransactionStore())
+        self.assertEqual(sorted(loaded.transaction(slot)["id"] for slot in loaded.slots()),
+                         sorted(self.store.ids[slot] for slot in self.store.slots()
+                                if self.store.category(slot) in ("Plain", "Café")))
+
+    def test_filters_and_deleted_rows(self):
+        self.store.delete(self.store.slot_of(2))
+        filename = self.path("export.ndjson")
+        result = Pythoncode.export_transactions(filename, self.store, "ndjson", start_date="2024-03-01",
+                                                end_date="2024-06-30", transaction_type="expense")
+        with open(filename, encoding="utf-8") as file:
+            records = [json.loads(line) for line in file]
+        expected = [slot for slot in self.store.slots() if self.store.transaction(slot)["type"] == "expense"
+                    and "2024-03-01" <= self.store.transaction(slot)["date"] <= "2024-06-30"]
+        self.assertEqual(result.exported, len(expected))
+        self.assertEqual(sorted(record["id"] for record in records), sorted(self.store.ids[slot] for slot in expected))
+        self.assertNotIn(2, [record["id"] for record in records])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            Pythoncode.export_transactions(self.path("export.xml"), self.store, "xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
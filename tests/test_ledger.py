@@ -0,0 +1,341 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Pythoncode
+
+
+# Function that returns the transactions of a store as (category, id, type, amount, date) tuples
+def rows_of(store):
+    return sorted((store.category(slot),) + tuple(store.transaction(slot).values()) for slot in store.slots())
+
+
+class LedgerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    # Function that opens a journal on filename and loads it into a new store
+    def open_journal(self, filename):
+        store = Pythoncode.TransactionStore()
+        journal = Pythoncode.TransactionJournal(store, filename)
+        journal.recover()
+        self.addCleanup(journal.close, compact=False)
+        return store, journal
+
+
+class JournalReplayTest(LedgerTestCase):
+    def write_ledger(self):
+        filename = self.path("ledger.json")
+        store, journal = self.open_journal(filename)
+        for day in range(1, 4):
+            slot = store.add("expense", "Food", float(day), f"2024-01-0{day}")
+            journal.append({"op": "add", "category": "Food", **store.transaction(slot)})
+        journal.close(compact=False)
+        return filename
+
+    def test_replay_applies_the_journal(self):
+        filename = self.write_ledger()
+        store, journal = self.open_journal(filename)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(journal.journal_records, 3)
+
+    def test_torn_last_record_is_cut_off(self):
+        filename = self.write_ledger()
+        complete_size = os.path.getsize(filename + ".journal")
+        with open(filename + ".journal", "a") as file:
+            file.write('{"op":"add","category":"Fo')
+        store, journal = self.open_journal(filename)
+        self.assertEqual(len(store), 3)
+        self.assertIsNone(store.load_error)
+        self.assertEqual(os.path.getsize(filename + ".journal"), complete_size)
+
+    def test_complete_last_record_without_newline_is_cut_off(self):
+        filename = self.write_ledger()
+        complete_size = os.path.getsize(filename + ".journal")
+        with open(filename + ".journal", "a") as file:
+            file.write('{"op":"delete","id":1}')
+        store, journal = self.open_journal(filename)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(os.path.getsize(filename + ".journal"), complete_size)
+
+    def test_record_that_does_not_apply_fails_the_load(self):
+        filename = self.write_ledger()
+        with open(filename + ".journal", "a") as file:
+            file.write('{"op":"delete","id":99}\n{"op":"delete","id":1}\n')
+        with open(filename + ".journal", "rb") as file:
+            contents = file.read()
+        store, journal = self.open_journal(filename)
+        self.assertIsNotNone(store.load_error)
+        self.assertFalse(journal.compact())
+        with self.assertRaises(ValueError):
+            journal.append({"op": "delete", "id": 2})
+        with open(filename + ".journal", "rb") as file:
+            self.assertEqual(file.read(), contents)
+
+    def test_invalid_record_before_the_end_fails_the_load(self):
+        filename = self.write_ledger()
+        with open(filename + ".journal", "rb") as file:
+            lines = file.readlines()
+        lines.insert(1, b"not json\n")
+        with open(filename + ".journal", "wb") as file:
+            file.writelines(lines)
+        store, journal = self.open_journal(filename)
+        self.assertIsNotNone(store.load_error)
+        with open(filename + ".journal", "rb") as file:
+            self.assertEqual(file.readlines(), lines)
+
+
+class CompactionTest(LedgerTestCase):
+    def test_compaction_folds_the_journal_into_the_snapshot(self):
+        filename = self.path("ledger.json")
+        store, journal = self.open_journal(filename)
+        slot = store.add("income", "Salary", 1000.0, "2024-02-01")
+        journal.append({"op": "add", "category": "Salary", **store.transaction(slot)})
+        self.assertTrue(journal.compact())
+        self.assertEqual(journal.journal_records, 0)
+        journal.close(compact=False)
+        self.assertEqual(rows_of(Pythoncode.load_transactions(filename, Pythoncode.TransactionStore())),
+                         rows_of(store))
+
+    def test_failed_journal_rename_keeps_the_journal_open(self):
+        filename = self.path("ledger.json")
+        store, journal = self.open_journal(filename)
+        replace = os.replace
+
+        def refuse_journal(source, destination):
+            if source == journal.journal_filename:
+                raise PermissionError("the journal is open in another process")
+            replace(source, destination)
+
+        with mock.patch.object(Pythoncode.os, "replace", refuse_journal):
+            self.assertFalse(journal.compact())
+        self.assertEqual(journal.generation, 0)
+        slot = store.add("income", "Salary", 1000.0, "2024-02-01")
+        journal.append({"op": "add", "category": "Salary", **store.transaction(slot)})
+        journal.close(compact=False)
+        store, journal = self.open_journal(filename)
+        self.assertEqual(len(store), 1)
+
+    def test_interrupted_compaction_is_finished_on_load(self):
+        filename = self.path("ledger.json")
+        store = Pythoncode.TransactionStore()
+        store.add("income", "Salary", 1000.0, "2024-02-01")
+        Pythoncode.write_snapshot(store, filename)
+        # The process died after moving the journal aside, before the new snapshot was written
+        with open(filename + ".compacting", "w") as file:
+            file.write('{"op":"add","id":2,"type":"expense","category":"Rent","amount":500.0,"date":"2024-02-02"}\n')
+        with open(filename + ".compact", "w") as file:
+            file.write('{"Rent": [')
+        store, journal = self.open_journal(filename)
+        self.assertEqual(len(store), 2)
+        self.assertFalse(os.path.exists(filename + ".compacting"))
+        self.assertFalse(os.path.exists(filename + ".compact"))
+        self.assertEqual(len(Pythoncode.load_transactions(filename, Pythoncode.TransactionStore())), 2)
+
+    def test_pending_compaction_keeps_merged_rows(self):
+        filename = self.path("ledger.json")
+        store, journal = self.open_journal(filename)
+        # Another process holds .compacting, so this one cannot compact and journals the merged rows instead
+        with open(filename + ".compacting", "w"):
+            pass
+        staging = Pythoncode.TransactionStore()
+        staging.add("expense", "Rent", 500.0, "2024-02-02")
+        self.assertTrue(journal.compact(merge=staging))
+        journal.close(compact=False)
+        os.remove(filename + ".compacting")
+        store, journal = self.open_journal(filename)
+        self.assertEqual(len(store), 1)
+
+
+class SharedLedgerTest(LedgerTestCase):
+    def add(self, store, journal, category, amount):
+        with journal.locked():
+            slot = store.add("expense", category, amount, "2024-03-01")
+            journal.append({"op": "add", "category": category, **store.transaction(slot)})
+        return store.ids[slot]
+
+    def test_other_process_changes_are_applied(self):
+        filename = self.path("ledger.json")
+        writer_store, writer = self.open_journal(filename)
+        reader_store, reader = self.open_journal(filename)
+        first_id = self.add(writer_store, writer, "Rent", 500.0)
+        self.assertEqual(reader.refresh(), 1)
+        self.assertEqual(rows_of(reader_store), rows_of(writer_store))
+        with reader.locked():  # Catches up before the new transaction gets its id
+            slot = reader_store.add("income", "Salary", 1000.0, "2024-03-02")
+            reader.append({"op": "add", "category": "Salary", **reader_store.transaction(slot)})
+        self.assertNotEqual(reader_store.ids[slot], first_id)
+        self.assertEqual(writer.refresh(), 1)
+        self.assertEqual(rows_of(reader_store), rows_of(writer_store))
+
+    def test_compaction_is_followed_without_a_reload(self):
+        filename = self.path("ledger.json")
+        writer_store, writer = self.open_journal(filename)
+        reader_store, reader = self.open_journal(filename)
+        self.add(writer_store, writer, "Rent", 500.0)
+        self.assertTrue(writer.compact())
+        self.add(writer_store, writer, "Rent", 600.0)
+        self.assertEqual(reader.refresh(), 2)
+        self.assertEqual(reader.generation, writer.generation)
+        self.assertEqual(rows_of(reader_store), rows_of(writer_store))
+
+    def test_merge_compaction_is_followed_without_a_reload(self):
+        filename = self.path("ledger.json")
+        writer_store, writer = self.open_journal(filename)
+        reader_store, reader = self.open_journal(filename)
+        staging = Pythoncode.TransactionStore()
+        for day in range(1, 4):
+            staging.add("expense", "Imported", float(day), f"2024-04-0{day}")
+        self.assertTrue(writer.compact(merge=staging))
+        self.assertEqual(reader.refresh(), 3)
+        self.assertEqual(rows_of(reader_store), rows_of(writer_store))
+
+    def test_large_catch_up_rebuilds_the_indexes(self):
+        filename = self.path("ledger.json")
+        writer_store, writer = self.open_journal(filename)
+        reader_store, reader = self.open_journal(filename)
+        reader_store.build_indexes()
+        for amount in (10.0, 20.0, 30.0):
+            self.add(writer_store, writer, "Rent", amount)
+        self.assertFalse(reader.refresh_is_large())
+        with mock.patch.object(Pythoncode, "LARGE_JOURNAL_BYTES", 10):
+            self.assertTrue(reader.refresh_is_large())
+            self.assertEqual(reader.refresh(), 3)
+        self.assertEqual(sorted(reader_store.indexes.amount_between(15, 40)), [1, 2])
+        self.assertEqual(reader_store.totals.summary(), (0.0, 60.0, -60.0))
+
+    def test_refresh_skips_while_the_ledger_is_locked(self):
+        filename = self.path("ledger.json")
+        writer_store, writer = self.open_journal(filename)
+        reader_store, reader = self.open_journal(filename)
+        self.add(writer_store, writer, "Rent", 500.0)
+        other = Pythoncode.LedgerLock(filename + ".lock")  # Held like another process would
+        self.addCleanup(other.close)
+        other.acquire()
+        self.assertEqual(reader.refresh(), 0)
+        other.release()
+        self.assertEqual(reader.refresh(), 1)
+
+    def test_change_needing_a_reload_is_refused_without_reload(self):
+        filename = self.path("ledger.json")
+        writer_store, writer = self.open_journal(filename)
+        reader_store, reader = self.open_journal(filename)
+        for amount in (1.0, 2.0):  # Two compactions, the reader cannot follow the journals it missed
+            self.add(writer_store, writer, "Rent", amount)
+            self.assertTrue(writer.compact())
+        with reader.locked(reload=False) as current:
+            self.assertFalse(current)
+        self.assertEqual(len(reader_store), 0)
+        with reader.locked() as current:
+            self.assertTrue(current)
+        self.assertEqual(rows_of(reader_store), rows_of(writer_store))
+
+
+class BinarySnapshotTest(LedgerTestCase):
+    def make_store(self):
+        store = Pythoncode.TransactionStore()
+        store.add("income", "Salary", 1000.0, "2024-02-01")
+        store.add("expense", "Rent", 500.0, "2024-02-02")
+        store.add("expense", "Café", 3.5, "2024-02-03")
+        return store
+
+    def test_round_trip(self):
+        store = self.make_store()
+        filename = self.path("ledger.ftb")
+        Pythoncode.write_snapshot(store, filename)
+        loaded = Pythoncode.load_transactions(filename, Pythoncode.TransactionStore())
+        self.assertIsNone(loaded.load_error)
+        self.assertEqual(rows_of(loaded), rows_of(store))
+
+    def test_truncated_file_fails_the_load(self):
+        filename = self.path("ledger.ftb")
+        Pythoncode.write_snapshot(self.make_store(), filename)
+        size = os.path.getsize(filename)
+        for length in (size - 1, size // 2, 4):  # Each one cuts the file further
+            with self.subTest(length=length):
+                with open(filename, "r+b") as file:
+                    file.truncate(length)
+                loaded = Pythoncode.load_transactions(filename, Pythoncode.TransactionStore())
+                self.assertIsNotNone(loaded.load_error)
+                self.assertEqual(len(loaded), 0)
+
+
+class LoadTransactionsTest(LedgerTestCase):
+    def test_invalid_rows_are_skipped(self):
+        filename = self.path("ledger.json")
+        with open(filename, "w") as file:
+            json.dump({"Food": [{"type": "expense", "amount": 5.0, "date": "2024-01-01"},
+                                {"type": "expense", "amount": 6.0, "date": "2021-02-31"},
+                                {"type": "expense", "amount": 7.0, "date": "2024-01-03"}]}, file)
+        loaded = Pythoncode.load_transactions(filename, Pythoncode.TransactionStore())
+        self.assertIsNone(loaded.load_error)
+        self.assertEqual(sorted(loaded.amounts[slot] for slot in loaded.slots()), [5.0, 7.0])
+
+    def test_invalid_rows_survive_a_save(self):
+        filename = self.path("ledger.json")
+        with open(filename, "w") as file:
+            json.dump({"Food": [{"type": "expense", "amount": 5.0, "date": "2024-01-01"},
+                                {"id": 7, "type": "expense", "amount": 6.0, "date": "2021-02-31"}]}, file)
+        store, journal = self.open_journal(filename)
+        slot = store.add("income", "Salary", 1000.0, "2024-02-01")
+        journal.append({"op": "add", "category": "Salary", **store.transaction(slot)})
+        self.assertGreater(store.ids[slot], 7)  # The id of the invalid row stays unused
+        self.assertTrue(journal.compact())
+        with open(filename) as file:
+            saved = json.load(file)
+        self.assertIn({"id": 7, "type": "expense", "amount": 6.0, "date": "2021-02-31"}, saved["Food"])
+        self.assertEqual(len(saved["Food"]), 2)
+
+    def test_unpadded_dates_are_accepted(self):
+        filename = self.path("ledger.json")
+        with open(filename, "w") as file:
+            json.dump({"Food": [{"type": "expense", "amount": 5.0, "date": "2024-5-1"}]}, file)
+        loaded = Pythoncode.load_transactions(filename, Pythoncode.TransactionStore())
+        self.assertEqual(loaded.invalid_rows, [])
+        self.assertEqual(loaded.transaction(0)["date"], "2024-05-01")
+        self.assertEqual(Pythoncode.date_to_ordinal("2024-5-1"), Pythoncode.date_to_ordinal("2024-05-01"))
+        with self.assertRaises(ValueError):
+            Pythoncode.date_to_ordinal("2024-W01-1")
+
+    def test_invalid_json_fails_the_load(self):
+        filename = self.path("ledger.json")
+        with open(filename, "w") as file:
+            file.write('{"Food": [{"type": "expense"')
+        loaded = Pythoncode.load_transactions(filename, Pythoncode.TransactionStore())
+        self.assertIsNotNone(loaded.load_error)
+
+
+class BulkImportTest(LedgerTestCase):
+    def test_bad_rows_are_skipped(self):
+        filename = self.path("bulk.csv")
+        with open(filename, "wb") as file:
+            file.write(b"income,Salary,1000,2024-02-01\n"
+                       b"expense,Caf\xe9,3.5,2024-02-03\n"  # Latin-1, not UTF-8
+                       b"expense,Rent,500\n"
+                       b"expense,Rent,abc,2024-02-02\n"
+                       b"expense,Rent,500,2024-13-01\n"
+                       b"expense,\"" + b"x" * 200000 + b"\",1,2024-02-04\n"  # Larger than the csv field limit
+                       b"\n"
+                       b"expense,Rent,500,2024-02-02\n")
+        store = Pythoncode.TransactionStore()
+        result = Pythoncode.read_bulk_transactions_from_file(filename, store)
+        self.assertEqual(result.imported, 2)
+        self.assertEqual(result.bad_row_count, 5)
+        self.assertEqual(sorted(store.category(slot) for slot in store.slots()), ["Rent", "Salary"])
+
+    def test_missing_file(self):
+        self.assertIsNone(Pythoncode.read_bulk_transactions_from_file(self.path("missing.csv"),
+                                                                      Pythoncode.TransactionStore()))
+
+
+if __name__ == "__main__":
+    unittest.main()
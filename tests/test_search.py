@@ -0,0 +1,137 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Pythoncode
+
+
+# Function that fills a store with count random transactions
+def random_store(count, seed=1):
+    generator = random.Random(seed)
+    store = Pythoncode.TransactionStore()
+    for _ in range(count):
+        date = f"2023-{generator.randrange(1, 13):02d}-{generator.randrange(1, 29):02d}"
+        store.add(generator.choice(Pythoncode.TRANSACTION_TYPES), f"Cat{generator.randrange(15)}",
+                  generator.randrange(1, 500) / 4, date)
+    return store
+
+
+# Function that returns the live slots whose transaction passes matches, by looking at every row
+def scan(store, matches):
+    return sorted(slot for slot in store.slots() if matches(store.transaction(slot), store.category(slot)))
+
+
+QUERIES = [
+    ("Category", "cat1", lambda transaction, category: category.casefold().startswith("cat1")),
+    ("Category", "Cat14", lambda transaction, category: category == "Cat14"),
+    ("Amount", "10..50", lambda transaction, category: 10 <= transaction["amount"] <= 50),
+    ("Amount", "25", lambda transaction, category: transaction["amount"] == 25),
+    ("Type", "inc", lambda transaction, category: transaction["type"] == "income"),
+    ("Date", "2023-0", lambda transaction, category: transaction["date"].startswith("2023-0")),
+    ("Date", "2023-11-2", lambda transaction, category: transaction["date"].startswith("2023-11-2")),
+    ("Date", "2023-03-01..2023-04-15",
+     lambda transaction, category: "2023-03-01" <= transaction["date"] <= "2023-04-15"),
+]
+
+
+class TransactionIndexesTest(unittest.TestCase):
+    def check(self, store):
+        indexes = store.indexes
+        for low, high in ((0, 1000), (10, 20), (25, 25), (200, 100)):
+            self.assertEqual(sorted(indexes.amount_between(low, high)),
+                             scan(store, lambda transaction, category: low <= transaction["amount"] <= high))
+        self.assertEqual(sorted(indexes.date_equal("2023-03-05")),
+                         scan(store, lambda transaction, category: transaction["date"] == "2023-03-05"))
+        self.assertEqual(sorted(indexes.month(2023, 11)),
+                         scan(store, lambda transaction, category: transaction["date"].startswith("2023-11")))
+        for transaction_type in Pythoncode.TRANSACTION_TYPES:
+            self.assertEqual(list(indexes.type_slots(transaction_type.upper())),
+                             scan(store, lambda transaction, category: transaction["type"] == transaction_type))
+        self.assertEqual(sorted(indexes.category("CAT3")),
+                         scan(store, lambda transaction, category: category == "Cat3"))
+        self.assertEqual(sorted(indexes.category_prefix("cat1")),
+                         scan(store, lambda transaction, category: category.startswith("Cat1")))
+
+    def test_indexes_follow_adds_updates_and_deletes(self):
+        store = random_store(300)
+        self.check(store)
+        generator = random.Random(3)
+        for _ in range(200):
+            slots = store.slots()
+            action = generator.randrange(3)
+            if action == 0:
+                store.add("income", f"Cat{generator.randrange(25)}", generator.randrange(1, 500) / 4, "2023-03-05")
+            elif action == 1:
+                store.update(generator.choice(slots), amount=generator.randrange(1, 500) / 4, date="2023-11-02")
+            else:
+                store.delete(generator.choice(slots))
+        self.check(store)
+
+    def test_bulk_extend_rebuilds_the_indexes(self):
+        store = random_store(50)
+        self.check(store)
+        staging = random_store(80, seed=4)
+        store.merge(staging)
+        self.assertEqual(len(store), 130)
+        self.check(store)
+
+
+class IncrementalSearchTest(unittest.TestCase):
+    def check(self, store, search):
+        for criteria, query, matches in QUERIES:
+            with self.subTest(criteria=criteria, query=query):
+                slots, summary = search.search(criteria, query)
+                self.assertEqual(sorted(slots), scan(store, matches))
+                income = sum(store.amounts[slot] for slot in slots if store.types[slot] == 0)
+                expense = sum(store.amounts[slot] for slot in slots if store.types[slot] == 1)
+                self.assertAlmostEqual(summary[0], income)
+                self.assertAlmostEqual(summary[1], expense)
+
+    def test_results_follow_adds_updates_and_deletes(self):
+        store = random_store(400)
+        search = Pythoncode.IncrementalSearch(store)
+        self.check(store, search)  # Builds the indexes and totals, which are then maintained incrementally
+        generator = random.Random(2)
+        for _ in range(150):
+            slots = store.slots()
+            action = generator.randrange(3)
+            if action == 0:
+                store.add("expense", f"Cat{generator.randrange(20)}", generator.randrange(1, 500) / 4, "2023-03-05")
+            elif action == 1:
+                store.update(generator.choice(slots), "income", generator.randrange(1, 500) / 4, "2023-11-21")
+            else:
+                store.delete(generator.choice(slots))
+        self.check(store, search)
+
+    def test_narrowing_matches_a_fresh_search(self):
+        store = random_store(400)
+        search = Pythoncode.IncrementalSearch(store)
+        for criteria, query in (("Category", "cat12"), ("Date", "2023-11-2"), ("Type", "expense")):
+            for length in range(1, len(query) + 1):
+                result = search.search(criteria, query[:length])
+            fresh = Pythoncode.IncrementalSearch(store).search(criteria, query)
+            self.assertEqual(sorted(result[0]), sorted(fresh[0]))
+
+    def test_incomplete_query_is_not_searched(self):
+        search = Pythoncode.IncrementalSearch(random_store(10))
+        self.assertIsNone(search.search("Amount", "12..x"))
+        self.assertIsNone(search.search("Type", ""))
+        self.assertIsNone(search.search("Date", "2023-13"))
+
+    def test_cache_is_bounded_by_slots_and_version(self):
+        store = random_store(400)
+        search = Pythoncode.IncrementalSearch(store, max_cached_slots=100)
+        for category in range(15):
+            search.search("Category", f"cat{category}")
+            self.assertLessEqual(search.cached_slots, 100)
+        store.add("income", "Cat1", 1.0, "2023-01-01")
+        search.search("Category", "cat2")
+        self.assertEqual(list(search.cache), [("Category", "cat2")])
+        self.assertEqual(search.cached_slots, len(search.cache[("Category", "cat2")][0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Pythoncode
+
+
+# Function that returns a store with count expense transactions spread over three categories
+def make_store(count):
+    store = Pythoncode.TransactionStore()
+    for number in range(count):
+        store.add("expense", f"Cat{number % 3}", float(number + 1), f"2024-01-{number % 28 + 1:02d}")
+    return store
+
+
+class DeleteTest(unittest.TestCase):
+    def test_deleted_rows_are_left_out_everywhere(self):
+        store = make_store(30)
+        store.build_indexes()
+        deleted = [store.slot_of(transaction_id) for transaction_id in (1, 4, 5)]
+        for slot in deleted:
+            store.delete(slot)
+        self.assertEqual(len(store), 27)
+        self.assertEqual(len(store.category_slots[0]), 10)  # Tombstones stay until compact_slots
+        live = set(store.slots())
+        self.assertTrue(live.isdisjoint(deleted))
+        self.assertEqual(set(store.slots_for_category("Cat0")),
+                         {slot for slot in live if store.category_ids[slot] == 0})
+        self.assertEqual(set(store.indexes.amount_between(0, 100)), live)
+        self.assertEqual(set(store.indexes.date_between("2024-01-01", "2024-01-31")), live)
+        self.assertEqual(set(store.indexes.type_slots("expense")), live)
+        self.assertEqual(set(store.indexes.category_prefix("cat")), live)
+        for column in ("Amount", "Date", "Type", "Category"):
+            self.assertEqual(sorted(store.sort_permutation(column)), sorted(live))
+        self.assertEqual(sum(len(rows) for rows in store.group_by_category().values()), 27)
+        self.assertEqual(store.totals.summary(), (0.0, 465.0 - 1 - 4 - 5, -(465.0 - 1 - 4 - 5)))
+        self.assertIsNone(store.slot_of(4))
+
+    def test_category_without_live_rows_is_gone(self):
+        store = make_store(3)
+        store.delete(store.slot_of(2))
+        self.assertNotIn("Cat1", store)
+        self.assertEqual(store.categories(), ["Cat0", "Cat2"])
+        self.assertNotIn("Cat1", store.group_by_category())
+
+    def test_compact_slots_renumbers_and_keeps_ids(self):
+        store = make_store(40)
+        store.build_indexes()
+        store.compact_after = 8
+        for transaction_id in range(1, 11):
+            store.delete(store.slot_of(transaction_id))
+        self.assertEqual(store.deleted, 0)  # Ten deleted slots out of forty triggered compact_slots
+        self.assertEqual(len(store.alive), 30)
+        self.assertEqual(sum(len(slots) for slots in store.category_slots), 30)
+        for transaction_id in range(11, 41):
+            slot = store.slot_of(transaction_id)
+            self.assertEqual(store.amounts[slot], float(transaction_id))
+        self.assertEqual(sorted(store.indexes.amount_between(0, 15)), sorted(map(store.slot_of, range(11, 16))))
+
+
+class JournalRecordTest(unittest.TestCase):
+    def test_update_and_delete_by_id(self):
+        store = make_store(5)
+        Pythoncode.apply_journal_record(store, {"op": "update", "id": 3, "type": "income", "amount": 9.5,
+                                                "date": "2024-02-02"})
+        self.assertEqual(store.transaction(store.slot_of(3)),
+                         {"id": 3, "type": "income", "amount": 9.5, "date": "2024-02-02"})
+        Pythoncode.apply_journal_record(store, {"op": "delete", "id": 3})
+        self.assertIsNone(store.slot_of(3))
+        self.assertEqual(len(store), 4)
+
+    def test_add_keeps_its_id(self):
+        store = make_store(2)
+        Pythoncode.apply_journal_record(store, {"op": "add", "id": 10, "type": "income", "category": "New",
+                                                "amount": 1.0, "date": "2024-02-02"})
+        self.assertEqual(store.category(store.slot_of(10)), "New")
+        self.assertEqual(store.next_id, 11)
+
+    def test_records_that_do_not_apply_raise(self):
+        store = make_store(2)
+        with self.assertRaises(KeyError):
+            Pythoncode.apply_journal_record(store, {"op": "delete", "id": 99})
+        with self.assertRaises(KeyError):
+            Pythoncode.apply_journal_record(store, {"op": "delete", "category": "Cat0", "index": 0})
+        with self.assertRaises(ValueError):
+            Pythoncode.apply_journal_record(store, {"op": "rename", "id": 1})
+        self.assertEqual(len(store), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()